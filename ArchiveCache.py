@@ -0,0 +1,203 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import zipfile
+import numpy as np
+from pathlib import Path
+from ArchiveReader import readConversations
+from Instrumentation import stage
+from MessageContent import MessageContent
+from MessageTable import MessageTable, MessageTableBuilder
+
+
+'''
+Author: Jonathan Chow
+Date Modified: 2026-10-18
+Python Version: 3.7
+
+On-disk cache of message tables so that repeated runs do not decompress and parse the archive again
+
+Each entry is a directory of .npy files (memory-mapped when read back) holding the columns of the table, with message
+content stored as its utf-8 buffer plus offsets (see MessageContent.py), so it is used without decoding when read back.
+Entries are keyed by the sha256 of the archive and the conversation folders read from it. The hash of an archive is only
+recomputed when its path, size or modification time changes.
+
+Run this file with --clear to invalidate the cache (for every archive, or only the one given).
+'''
+
+
+CACHE_VERSION = 4
+ARRAY_NAMES = ['conversation', 'sender', 'timestampMs', 'contentOffsets', 'contentBuffer']
+
+
+def archiveIndexPath(cacheDir):
+    return Path(cacheDir) / 'archives.json'
+
+
+def readArchiveIndex(cacheDir):
+    try:
+        with open(archiveIndexPath(cacheDir), 'r') as indexFile:
+            return json.load(indexFile)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def writeArchiveIndex(cacheDir, archiveIndex):
+    Path(cacheDir).mkdir(parents=True, exist_ok=True)
+
+    tempPath = archiveIndexPath(cacheDir).with_suffix('.tmp')
+
+    with open(tempPath, 'w') as indexFile:
+        json.dump(archiveIndex, indexFile, indent=2)
+
+    os.replace(tempPath, archiveIndexPath(cacheDir))
+
+
+# Get the sha256 of an archive, reusing the stored hash when its path, size and modification time are unchanged
+def archiveHash(archivePath, cacheDir):
+    archivePath = str(Path(archivePath).resolve())
+    archiveStat = os.stat(archivePath)
+
+    archiveIndex = readArchiveIndex(cacheDir)
+    entry = archiveIndex.get(archivePath)
+
+    if entry is not None and entry['size'] == archiveStat.st_size and entry['mtime'] == archiveStat.st_mtime_ns:
+        return entry['sha256']
+
+    sha256 = hashlib.sha256()
+
+    with open(archivePath, 'rb') as archiveFile:
+        for chunk in iter(lambda: archiveFile.read(1 << 20), b''):
+            sha256.update(chunk)
+
+    archiveIndex[archivePath] = {'size': archiveStat.st_size, 'mtime': archiveStat.st_mtime_ns, 'sha256': sha256.hexdigest()}
+    writeArchiveIndex(cacheDir, archiveIndex)
+
+    return sha256.hexdigest()
+
+
+def cacheKey(sha256, folders):
+    key = hashlib.sha256()
+    key.update(str(CACHE_VERSION).encode())
+    key.update(sha256.encode())
+
+    for folder in folders:
+        key.update(b'\0' + folder.encode())
+
+    return key.hexdigest()
+
+
+def writeTable(table, entryPath, sha256):
+    tempPath = entryPath.with_suffix('.tmp')
+    shutil.rmtree(tempPath, ignore_errors=True)
+    tempPath.mkdir(parents=True)
+
+    arrays = {'conversation': table.conversation,
+              'sender': table.sender,
+              'timestampMs': table.timestampMs,
+              'contentOffsets': table.content.offsets,
+              'contentBuffer': table.content.buffer}
+
+    for name in ARRAY_NAMES:
+        np.save(tempPath / (name + '.npy'), arrays[name])
+
+    with open(tempPath / 'meta.json', 'w') as metaFile:
+        json.dump({'version': CACHE_VERSION,
+                   'archive': sha256,
+                   'participants': table.participants,
+                   'conversationParticipants': [codes.tolist() for codes in table.conversationParticipants],
+                   'conversationThreads': table.conversationThreads}, metaFile)
+
+    shutil.rmtree(entryPath, ignore_errors=True)
+    os.replace(tempPath, entryPath)
+
+
+def readTable(entryPath):
+    with open(entryPath / 'meta.json', 'r') as metaFile:
+        meta = json.load(metaFile)
+
+    arrays = {name: np.load(entryPath / (name + '.npy'), mmap_mode='r') for name in ARRAY_NAMES}
+
+    return MessageTable(meta['participants'],
+                        [np.array(codes, dtype=np.int32) for codes in meta['conversationParticipants']],
+                        arrays['conversation'],
+                        arrays['sender'],
+                        arrays['timestampMs'],
+                        MessageContent(arrays['contentBuffer'], arrays['contentOffsets']),
+                        meta['conversationThreads'])
+
+
+# Directory of the cache entry of the table for the given conversation folders (other data derived from the table, e.g.
+# its search index, is stored in it too)
+def tableEntryPath(archivePath, folders, cacheDir='Cache/'):
+    return Path(cacheDir) / 'tables' / cacheKey(archiveHash(archivePath, cacheDir), folders)
+
+
+# Load the table for the given conversation folders from the cache, reading the archive only on a miss
+def loadMessageTable(archivePath, folders, workers=1, cacheDir='Cache/'):
+    sha256 = archiveHash(archivePath, cacheDir)
+    entryPath = Path(cacheDir) / 'tables' / cacheKey(sha256, folders)
+
+    if (entryPath / 'meta.json').exists():
+        with stage('cache read') as record:
+            table = readTable(entryPath)
+            record['messages'] = len(table)
+
+        return table
+
+    builder = MessageTableBuilder()
+
+    with stage('open archive'):
+        archive = zipfile.ZipFile(archivePath, 'r')
+
+    with archive:
+        readConversations(archive, folders, builder, workers)
+
+    with stage('build table', len(builder.timestampMs)):
+        table = builder.build()
+
+    with stage('cache write', len(table)):
+        writeTable(table, entryPath, sha256)
+
+    return table
+
+
+# Remove cached tables for one archive (or every archive if none is given)
+def clearCache(cacheDir='Cache/', archivePath=None):
+    if archivePath is None:
+        shutil.rmtree(cacheDir, ignore_errors=True)
+        return
+
+    archiveIndex = readArchiveIndex(cacheDir)
+    entry = archiveIndex.pop(str(Path(archivePath).resolve()), None)
+
+    if entry is None:
+        return
+
+    # Entries are keyed by a hash of the archive hash and folders so each table records the archive it was read from
+    for entryPath in (Path(cacheDir) / 'tables').glob('*'):
+        try:
+            with open(entryPath / 'meta.json', 'r') as metaFile:
+                sha256 = json.load(metaFile).get('archive')
+        except (FileNotFoundError, ValueError):
+            sha256 = None
+
+        if sha256 == entry['sha256']:
+            shutil.rmtree(entryPath, ignore_errors=True)
+
+    writeArchiveIndex(cacheDir, archiveIndex)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the cache of parsed message archives')
+    parser.add_argument('--clear', action='store_true', help='remove cached tables')
+    parser.add_argument('--cache-dir', default='Cache/', help='cache directory (default: Cache/)')
+    parser.add_argument('archive', nargs='?', help='only clear tables read from this archive')
+    args = parser.parse_args()
+
+    if args.clear:
+        clearCache(args.cache_dir, args.archive)
+    else:
+        parser.print_help()
@@ -0,0 +1,246 @@
+import concurrent.futures
+import io
+import itertools
+import json
+import re
+import zipfile
+import numpy as np
+from Instrumentation import addRecords, recordedCall, stage, workerSettings
+from MessageContent import MessageContent
+from MessageTable import MessageTableBuilder
+
+
+'''
+Author: Jonathan Chow
+Date Modified: 2026-10-18
+Python Version: 3.7
+
+Functions for reading conversations out of the Facebook Messenger .zip archive
+
+Each message_N.json shard is decoded incrementally from the zip member stream. Messages are yielded one at a time as
+they are parsed so neither the raw json nor the parsed document for a shard is ever held in memory. Shards can also be
+spread across a process pool, where each worker opens the archive itself and sends back compact columns.
+
+Facebook writes every byte of utf-8 encoded text as its own \\u00XX escape, so json decodes non-ASCII text as mojibake
+(e.g. 'é' as 'Ã©'). Encoding such text as latin-1 gives back its utf-8 bytes. The content of a shard is repaired at
+once from the utf-8 buffer it is read into (see MessageContent.py), and sender names once per name.
+'''
+
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class JsonStream:
+    def __init__(self, stream, chunkSize):
+        self.reader = io.TextIOWrapper(stream, encoding='utf-8')
+        self.chunkSize = chunkSize
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    # Read another chunk from the stream, dropping the part of the buffer that has already been consumed
+    def fill(self):
+        chunk = self.reader.read(self.chunkSize)
+        self.eof = len(chunk) == 0
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return not self.eof
+
+    # Skip whitespace and return the next character without consuming it
+    def peek(self):
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+
+            if not self.fill():
+                raise ValueError('Unexpected end of json stream')
+
+    def expect(self, characters):
+        character = self.peek()
+
+        if character not in characters:
+            raise ValueError('Expected one of ' + repr(characters) + ' but found ' + repr(character))
+
+        self.pos += 1
+        return character
+
+    # Decode the next complete json value
+    # A value ending exactly at the end of the buffer may be a truncated number so more is read before accepting it
+    def decode(self):
+        self.peek()
+
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+
+            self.fill()
+
+
+# Get the text Facebook meant from its mojibake, raising UnicodeError if text is not mojibake
+def fixMojibake(text):
+    return text.encode('latin-1').decode('utf-8')
+
+
+# Repair text if it is mojibake, leaving any other text as it is
+def repairText(text):
+    try:
+        return fixMojibake(text)
+    except UnicodeError:
+        return text
+
+
+# Repair the sender names of messages as they are decoded (each name once), then the participants of the shard
+def repairNames(messages, shardInfo):
+    names = {}
+
+    for message in messages:
+        name = message['sender_name']
+
+        if name not in names:
+            names[name] = repairText(name)
+
+        message['sender_name'] = names[name]
+        yield message
+
+    for parDict in shardInfo.get('participants', []):
+        parDict['name'] = repairText(parDict['name'])
+
+
+# Repair the content of the messages appended to a builder since message start
+# The content of every message is repaired with one decode when all of it is mojibake (as in an export), and message by
+# message otherwise
+def repairContent(builder, start):
+    content = builder.contentSince(start)
+
+    if len(content.buffer) == 0 or content.buffer.max() < 0x80:
+        return
+
+    if content.separable():
+        try:
+            builder.replaceContent(start, MessageContent.fromText(fixMojibake(content.text()), content.hasContent()))
+            return
+        except UnicodeError:
+            pass
+
+    texts = np.full(len(content), None, dtype=object)
+    texts[content.hasContent()] = [repairText(text) for text in content.strings()]
+
+    builder.replaceContent(start, MessageContent.fromStrings(texts))
+
+
+# Yield the messages of a single shard as they are decoded
+# All other top level fields of the shard (participants, title, ...) are stored in shardInfo
+def iterShardMessages(stream, shardInfo, chunkSize=1 << 16):
+    jsonStream = JsonStream(stream, chunkSize)
+
+    jsonStream.expect('{')
+
+    if jsonStream.peek() == '}':
+        return
+
+    while True:
+        key = jsonStream.decode()
+        jsonStream.expect(':')
+
+        if key == 'messages':
+            jsonStream.expect('[')
+
+            if jsonStream.peek() != ']':
+                while True:
+                    yield jsonStream.decode()
+
+                    if jsonStream.expect(',]') == ']':
+                        break
+            else:
+                jsonStream.expect(']')
+        else:
+            shardInfo[key] = jsonStream.decode()
+
+        if jsonStream.expect(',}') == '}':
+            break
+
+
+# Get every conversation folder in the inbox of an archive (the folders holding a message_1.json shard)
+def inboxFolders(archive):
+    return sorted(name.split('/')[2] for name in archive.namelist()
+                  if name.startswith('messages/inbox/') and name.endswith('/message_1.json') and name.count('/') == 3)
+
+
+# Yield the name of each message_N.json shard in a conversation folder
+def conversationShards(archive, folder):
+    shardIndex = 1
+
+    while True:
+        shardID = 'messages/inbox/' + folder + '/message_' + str(shardIndex) + '.json'
+
+        try:
+            archive.getinfo(shardID)
+        except KeyError:
+            break
+
+        yield shardID
+        shardIndex += 1
+
+
+# Get the conversation folder of a shard
+def shardFolder(shardID):
+    return shardID.split('/')[-2]
+
+
+# Stream a single shard into a MessageTableBuilder, skipping messages sent at or before highWaterMark (if given)
+# Mojibake in sender names and content is repaired as the shard is read
+def readShard(archive, shardID, builder, highWaterMark=None):
+    shardInfo = {}
+    messageCount = len(builder.timestampMs)
+
+    with stage('read ' + shardID) as record, archive.open(shardID) as stream:
+        messages = iterShardMessages(stream, shardInfo)
+
+        if highWaterMark is not None:
+            messages = (message for message in messages if message['timestamp_ms'] > highWaterMark)
+
+        builder.addShard(shardInfo, repairNames(messages, shardInfo), shardFolder(shardID))
+        repairContent(builder, messageCount)
+        record['messages'] = len(builder.timestampMs) - messageCount
+
+
+# Read a single shard in a worker process, returning only the columns kept by the builder
+def readShardColumns(archivePath, shardID, highWaterMark=None):
+    builder = MessageTableBuilder()
+
+    with zipfile.ZipFile(archivePath, 'r') as archive:
+        readShard(archive, shardID, builder, highWaterMark)
+
+    return builder
+
+
+# Stream every shard of the given conversation folders into a MessageTableBuilder
+# Only messages after the high-water mark of their folder are kept (if given)
+# With more than one worker the shards are read in a process pool and merged in the same order as a sequential read
+# Returns the shards read, in the order of the conversations they were added as to the builder
+def readConversations(archive, folders, builder, workers=1, highWaterMarks=None):
+    shardIDs = [shardID for folder in folders for shardID in conversationShards(archive, folder)]
+    shardMarks = [(highWaterMarks or {}).get(shardFolder(shardID)) for shardID in shardIDs]
+
+    if workers == 1 or len(shardIDs) <= 1:
+        for shardID, highWaterMark in zip(shardIDs, shardMarks):
+            readShard(archive, shardID, builder, highWaterMark)
+        return shardIDs
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        for shardBuilder, records in pool.map(recordedCall, itertools.repeat(workerSettings()), itertools.repeat(readShardColumns),
+                                              [archive.filename] * len(shardIDs), shardIDs, shardMarks):
+            builder.merge(shardBuilder)
+            addRecords(records)
+
+    return shardIDs
@@ -0,0 +1,194 @@
+import argparse
+import concurrent.futures
+import datetime
+import json
+import os
+import zipfile
+from pathlib import Path
+from ArchiveCache import archiveHash, loadMessageTable
+from ArchiveReader import conversationShards, inboxFolders, shardFolder
+from FeatureExtraction import SPECIFIC_FEATURES, aggregateFeatures
+from FeatureSinks import DATA_FORMATS, sinkFeatures
+from Instrumentation import addRecords, recordedCall, startInstrumentation, stopInstrumentation, workerSettings, writeReport
+
+
+'''
+Author: Jonathan Chow
+Date Modified: 2026-10-18
+Python Version: 3.7
+
+Analysis of every conversation in a Facebook Messenger archive
+
+The conversation folders are found in the inbox of the archive rather than listed in BookmarkedConversations, and each
+is classified as an individual (two participant) or group conversation. All folders are read into one table (cached like
+any other, see ArchiveCache.py) which is then split per conversation and analyzed in a process pool with a bounded
+number of conversations in flight. Finished folders are recorded in the output directory after each one so a run that
+stops part way can be resumed. A window of dates (see MessageTable.dateWindow) restricts every conversation to the
+messages sent in it.
+'''
+
+
+PROGRESS_FILE = 'progress.json'
+
+
+def readProgress(outputDir, sha256, window=None):
+    try:
+        with open(Path(outputDir) / PROGRESS_FILE, 'r') as progressFile:
+            progress = json.load(progressFile)
+    except (FileNotFoundError, ValueError):
+        progress = {}
+
+    # Progress made on a different archive (or window of it) does not count
+    if progress.get('archive') != sha256 or progress.get('window', {}) != (window or {}):
+        progress = {'archive': sha256, 'window': window or {}, 'completed': []}
+
+    return progress
+
+
+def writeProgress(outputDir, progress):
+    tempPath = Path(outputDir) / (PROGRESS_FILE + '.tmp')
+
+    with open(tempPath, 'w') as progressFile:
+        json.dump(progress, progressFile, indent=2)
+
+    os.replace(tempPath, Path(outputDir) / PROGRESS_FILE)
+
+
+# Get 'Individual' or 'Group' for a conversation from its participants (None if I am not one of them)
+def conversationType(table, self):
+    participants = set(table.participants)
+
+    if self not in participants:
+        return None
+
+    return 'Individual' if len(participants) == 2 else 'Group'
+
+
+# Compute the features of a single conversation and write them as data and/or graphs (in a worker process)
+def analyzeConversation(table, self, convType, outputDir, dataFormats=(), charts=True):
+    Path(outputDir).mkdir(parents=True, exist_ok=True)
+
+    sinkFeatures(aggregateFeatures(table, self, SPECIFIC_FEATURES), outputDir, self, convType, dataFormats, charts, table.dateRange())
+
+
+# Yield (folder, type, table) for each conversation in folders, skipping the ones I am not a participant of and the ones
+# without messages
+def splitConversations(table, shardIDs, folders, self):
+    convIndices = {}
+
+    for convIndex, shardID in enumerate(shardIDs):
+        convIndices.setdefault(shardFolder(shardID), []).append(convIndex)
+
+    for folder in folders:
+        convTable = table.selectConversations(convIndices[folder])
+        convType = conversationType(convTable, self)
+
+        if convType is None:
+            print(str(datetime.datetime.now()) + ': Skipped ' + folder + ' (' + self + ' is not a participant)')
+            continue
+
+        if len(convTable) == 0:
+            print(str(datetime.datetime.now()) + ': Skipped ' + folder + ' (no messages)')
+            continue
+
+        yield folder, convType, convTable
+
+
+# Analyze every conversation in the inbox of an archive, writing the graphs of each to outputDir/<folder>/
+# At most 2 * workers conversations are waiting on the pool at once; folders finished by a previous run are skipped
+# window holds the keyword arguments of MessageTable.dateWindow to only analyze the messages sent in a window of dates
+def analyzeArchive(archivePath, self, outputDir, workers=1, cacheDir='Cache/', timezone='UTC', participantTimezones=None, dataFormats=(),
+                   charts=True, window=None):
+    Path(outputDir).mkdir(parents=True, exist_ok=True)
+
+    with zipfile.ZipFile(archivePath, 'r') as archive:
+        folders = inboxFolders(archive)
+        shardIDs = [shardID for folder in folders for shardID in conversationShards(archive, folder)]
+
+    progress = readProgress(outputDir, archiveHash(archivePath, cacheDir), window)
+    remaining = [folder for folder in folders if folder not in progress['completed']]
+
+    if len(remaining) == 0:
+        return
+
+    # Read every conversation at once (in the same order as shardIDs) so the table is cached for resumed runs
+    table = loadMessageTable(archivePath, folders, workers, cacheDir)
+    table.setTimezone(timezone, participantTimezones)
+
+    if window is not None:
+        table = table.dateWindow(**window)
+
+    conversations = splitConversations(table, shardIDs, remaining, self)
+
+    def completed(folder, future=None, error=None):
+        error = future.exception() if future is not None else error
+
+        if error is not None:
+            print(str(datetime.datetime.now()) + ': Failed ' + folder + ' (' + repr(error) + ')')
+            return
+
+        if future is not None:
+            addRecords(future.result()[1])
+
+        progress['completed'].append(folder)
+        writeProgress(outputDir, progress)
+
+    if workers == 1:
+        for folder, convType, convTable in conversations:
+            try:
+                analyzeConversation(convTable, self, convType, str(Path(outputDir) / folder) + '/', dataFormats, charts)
+            except Exception as error:
+                completed(folder, error=error)
+            else:
+                completed(folder)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+
+        for folder, convType, convTable in conversations:
+            pending[pool.submit(recordedCall, workerSettings(), analyzeConversation, convTable, self, convType,
+                                str(Path(outputDir) / folder) + '/', dataFormats, charts)] = folder
+
+            while len(pending) >= 2 * workers:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                for future in done:
+                    completed(pending.pop(future), future)
+
+        for future in concurrent.futures.as_completed(pending):
+            completed(pending[future], future)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Graph the features of every conversation in a message archive')
+    parser.add_argument('archive', help='.zip file of messages')
+    parser.add_argument('self', help='your name as it appears in the archive')
+    parser.add_argument('--output-dir', default='Output/All/', help='output directory (default: Output/All/)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of processes (default: all cpus)')
+    parser.add_argument('--cache-dir', default='Cache/', help='cache directory (default: Cache/)')
+    parser.add_argument('--timezone', default='UTC', help='timezone messages are bucketed into days in (default: UTC)')
+    parser.add_argument('--data', nargs='+', choices=DATA_FORMATS, default=[], metavar='FORMAT',
+                        help='write the data of each feature in these formats, any of: ' + ', '.join(DATA_FORMATS))
+    parser.add_argument('--no-charts', action='store_true', help='do not draw graphs (e.g. with --data)')
+    parser.add_argument('--start', help='only analyze messages sent on or after this date (YYYY-MM-DD, in --timezone)')
+    parser.add_argument('--end', help='only analyze messages sent on or before this date (YYYY-MM-DD, in --timezone)')
+    parser.add_argument('--last-days', type=int, help='only analyze messages sent in the last days of the archive (replaces --start)')
+    parser.add_argument('--report', help='write the wall/CPU time, peak RSS and messages/s of each stage to this json file')
+    parser.add_argument('--profile-dir', help='write cProfile stats of each stage to this directory (and the report, without --report)')
+    args = parser.parse_args()
+
+    window = {'start': args.start, 'end': args.end, 'lastDays': args.last_days}
+
+    print(str(datetime.datetime.now()) + ': Started')
+
+    if args.report is not None or args.profile_dir is not None:
+        startInstrumentation(args.profile_dir)
+
+    analyzeArchive(args.archive, args.self, args.output_dir, args.workers, args.cache_dir, args.timezone, None, args.data, not args.no_charts,
+                   window if any(value is not None for value in window.values()) else None)
+
+    if args.report is not None or args.profile_dir is not None:
+        writeReport(args.report or str(Path(args.profile_dir) / 'report.json'), stopInstrumentation())
+
+    print(str(datetime.datetime.now()) + ': Finished')
@@ -0,0 +1,80 @@
+import sys
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from FeatureExtraction import participantFrame
+from MessageContent import MessageContent
+from MessageTable import MessageTable, ms2dt
+
+
+'''
+Author: Jonathan Chow
+Date Modified: 2026-10-18
+Python Version: 3.7
+
+Micro-benchmark of building per participant frames as the number of participants grows
+
+Compares participantFrame (one groupby/unstack) with the previous approach of filling a dictionary per participant and
+concatenating one frame per participant. Run from the repository root: python Benchmarks/FrameBuildBenchmark.py
+'''
+
+
+# Previous construction: a dictionary of {date: count} per participant concatenated one participant at a time
+def iterativeConcat(table):
+    featureDict = {participant: {} for participant in table.participants}
+
+    for sender, timestampMs in zip(table.sender, table.timestampMs):
+        try:
+            featureDict[table.participants[sender]][ms2dt(timestampMs).date()] += 1
+        except KeyError:
+            featureDict[table.participants[sender]][ms2dt(timestampMs).date()] = 1
+
+    featureDF = pd.DataFrame()
+
+    for participant in featureDict:
+        temp = pd.DataFrame(featureDict[participant], index=[participant]).transpose()
+        featureDF = pd.concat([featureDF, temp], sort=True, ignore_index=False, axis=1)
+
+    return featureDF.fillna(0)
+
+
+def syntheticTable(participantCount, messagesPerParticipant, days=365):
+    rng = np.random.default_rng(0)
+    messageCount = participantCount * messagesPerParticipant
+
+    sender = np.repeat(np.arange(participantCount, dtype=np.int32), messagesPerParticipant)
+    timestampMs = 1500000000000 + rng.integers(0, days * 86400000, messageCount)
+
+    return MessageTable(['Participant ' + str(index) for index in range(participantCount)],
+                        [np.arange(participantCount, dtype=np.int32)],
+                        np.zeros(messageCount, dtype=np.int32),
+                        sender,
+                        timestampMs.astype(np.int64),
+                        MessageContent.fromStrings([None] * messageCount))
+
+
+def timeIt(function, repeats=3):
+    best = float('inf')
+
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+if __name__ == '__main__':
+    print('{:>12} {:>10} {:>16} {:>16}'.format('participants', 'messages', 'iterative (s)', 'single pass (s)'))
+
+    for participantCount in [2, 8, 32, 128, 512]:
+        table = syntheticTable(participantCount, 200)
+
+        iterativeTime = timeIt(lambda: iterativeConcat(table), 1)
+        singlePassTime = timeIt(lambda: participantFrame(table, table.days, np.ones(len(table))))
+
+        print('{:>12} {:>10} {:>16.4f} {:>16.4f}'.format(participantCount, len(table), iterativeTime, singlePassTime))
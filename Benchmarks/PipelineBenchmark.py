@@ -0,0 +1,144 @@
+import argparse
+import gc
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ArchiveReader import inboxFolders, readConversations
+from FeatureExtraction import FEATURE_AGGREGATES, FEATURE_OUTPUTS, SPECIFIC_FEATURES
+from FeatureSinks import FEATURE_CHARTS
+from Instrumentation import peakRSS
+from MessageTable import MessageTableBuilder
+from SyntheticArchive import SELF_NAME, writeArchive
+
+
+'''
+Author: Jonathan Chow
+Date Modified: 2026-10-18
+Python Version: 3.7
+
+Benchmark of each stage of the analysis on synthetic archives (see SyntheticArchive.py) of increasing size
+
+Stages are reading the zip members, json.loads of every shard, the streamed parse into a MessageTable, tokenizing,
+the aggregate and outputs of each feature and (with --charts) drawing each graph. Each stage is timed (best of
+--repeats) and then run once more under tracemalloc for its peak memory. Run from the repository root:
+python Benchmarks/PipelineBenchmark.py --messages 1000 10000 100000
+'''
+
+
+# Time a stage (best of repeats), then measure the peak memory it allocates with tracemalloc
+def measureStage(function, repeats=1):
+    best = float('inf')
+
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return result, best, peak
+
+
+def readMembers(archivePath):
+    with zipfile.ZipFile(archivePath, 'r') as archive:
+        return [archive.read(name) for name in archive.namelist() if name.endswith('.json')]
+
+
+def loadMembers(archivePath):
+    with zipfile.ZipFile(archivePath, 'r') as archive:
+        return [json.loads(archive.read(name)) for name in archive.namelist() if name.endswith('.json')]
+
+
+def ingest(archivePath):
+    builder = MessageTableBuilder()
+
+    with zipfile.ZipFile(archivePath, 'r') as archive:
+        readConversations(archive, inboxFolders(archive), builder)
+
+    return builder.build()
+
+
+def tokenize(table):
+    table.tokenStream = None
+    table.wordVocabulary = None
+    table.counts = None
+
+    return table.vocabulary()
+
+
+# Run every stage on one archive, returning a list of (stage, seconds, peak bytes) and the number of messages
+def benchmarkArchive(archivePath, convType, charts=False, repeats=1):
+    stages = []
+
+    def stage(name, function):
+        result, seconds, peak = measureStage(function, repeats)
+        stages.append((name, seconds, peak))
+        return result
+
+    stage('zip read', lambda: readMembers(archivePath))
+    stage('json.loads', lambda: loadMembers(archivePath))
+    table = stage('ingest', lambda: ingest(archivePath))
+    stage('tokenize', lambda: tokenize(table))
+
+    featureNames = SPECIFIC_FEATURES + [featureName for featureName in FEATURE_AGGREGATES if featureName not in SPECIFIC_FEATURES]
+
+    with tempfile.TemporaryDirectory() as outputDir:
+        for featureName in featureNames:
+            aggregate = stage('aggregate ' + featureName, lambda: FEATURE_AGGREGATES[featureName][0](table, SELF_NAME))
+            outputs = stage('outputs ' + featureName, lambda: FEATURE_OUTPUTS[featureName](aggregate, SELF_NAME))
+
+            if charts:
+                for title, data in outputs.items():
+                    stage('chart ' + title, lambda: FEATURE_CHARTS[featureName](data, title, outputDir + '/', SELF_NAME, convType))
+
+    return stages, len(table)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark each stage of the analysis on synthetic archives')
+    parser.add_argument('--messages', type=int, nargs='+', default=[1000, 10000, 100000], help='messages per archive')
+    parser.add_argument('--conversations', type=int, default=4, help='conversations per archive (default: 4)')
+    parser.add_argument('--participants', type=int, default=1, help='other participants per conversation (default: 1)')
+    parser.add_argument('--days', type=int, default=365 * 8, help='days the messages are spread over (default: 2920)')
+    parser.add_argument('--words', type=float, default=8, help='average words per message (default: 8)')
+    parser.add_argument('--charts', action='store_true', help='also benchmark drawing each graph')
+    parser.add_argument('--repeats', type=int, default=1, help='runs of each stage, the fastest is reported (default: 1)')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    convType = 'Individual' if args.participants == 1 else 'Group'
+    results = []
+
+    print('{:>10} {:<72} {:>10} {:>14} {:>10}'.format('messages', 'stage', 'time (s)', 'messages/s', 'peak (MB)'))
+
+    with tempfile.TemporaryDirectory() as archiveDir:
+        for messageCount in args.messages:
+            archivePath = str(Path(archiveDir) / ('synthetic' + str(messageCount) + '.zip'))
+            writeArchive(archivePath, args.conversations, args.participants, max(messageCount // args.conversations, 1), args.days, args.words)
+
+            stages, tableLength = benchmarkArchive(archivePath, convType, args.charts, args.repeats)
+
+            for name, seconds, peak in stages:
+                throughput = tableLength / seconds if seconds > 0 else float('inf')
+                results.append({'messages': tableLength, 'stage': name, 'seconds': seconds, 'messagesPerSecond': throughput, 'peakBytes': peak})
+
+                print('{:>10} {:<72} {:>10.4f} {:>14.0f} {:>10.1f}'.format(tableLength, name, seconds, throughput, peak / 2 ** 20))
+
+    if peakRSS() is not None:
+        print('Peak RSS of the benchmark: {:.1f} MB'.format(peakRSS() / 2 ** 20))
+
+    if args.json is not None:
+        with open(args.json, 'w') as resultFile:
+            json.dump(results, resultFile, indent=2)
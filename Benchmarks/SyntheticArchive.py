@@ -0,0 +1,95 @@
+import argparse
+import datetime
+import json
+import zipfile
+import numpy as np
+
+
+'''
+Author: Jonathan Chow
+Date Modified: 2026-10-18
+Python Version: 3.7
+
+Generator of synthetic Facebook Messenger archives for benchmarking
+
+Archives follow the layout of a Facebook export: messages/inbox/<folder>/message_N.json shards of at most 10000 messages
+listed newest first, each with the participants of the conversation. Words are drawn from a Zipf distribution over a
+fixed vocabulary (which includes the pronouns and words of interest used by the features) so word counts look like
+those of real conversations. The name of the owner of the archive is SELF_NAME.
+'''
+
+
+SELF_NAME = 'Self Person'
+SHARD_SIZE = 10000
+VOCABULARY = ['i', 'you', 'the', 'lol', 'yeah', 'nice', 'sorry', 'interesting', 'lmao', 'neat', 'omg', 'hmm', 'fair', 'to', 'and',
+              'a', 'it', 'is', 'that', 'what', 'do', 'we', 'so', 'no', 'ok', 'haha', 'going', 'tomorrow', 'today', 'café',
+              'Thanks!', "don't", 'really?', 'maybe...'] + ['word' + str(index) for index in range(2000)]
+
+
+# Get the messages of one conversation (oldest first) as a list of json objects
+def syntheticMessages(rng, participants, messageCount, startMs, days, wordsPerMessage):
+    timestampMs = np.sort(startMs + rng.integers(0, days * 86400000, messageCount))
+    senders = rng.integers(0, len(participants), messageCount)
+    wordCounts = np.maximum(rng.poisson(wordsPerMessage, messageCount), 1)
+    words = np.minimum(rng.zipf(1.3, wordCounts.sum()), len(VOCABULARY)) - 1
+    hasContent = rng.random(messageCount) < 0.95
+
+    wordOffsets = np.concatenate([[0], np.cumsum(wordCounts)]).tolist()
+    messages = []
+
+    for index in range(messageCount):
+        message = {'sender_name': participants[senders[index]], 'timestamp_ms': int(timestampMs[index]), 'type': 'Generic'}
+
+        if hasContent[index]:
+            message['content'] = ' '.join(VOCABULARY[word] for word in words[wordOffsets[index]:wordOffsets[index + 1]])
+        else:
+            message['photos'] = [{'uri': 'messages/inbox/photos/' + str(index) + '.jpg', 'creation_timestamp': int(timestampMs[index]) // 1000}]
+
+        messages.append(message)
+
+    return messages
+
+
+# Write an archive of conversationCount conversations between me and participantCount other participants each, with
+# messageCount messages spread over days from startDate and wordsPerMessage words per message on average
+# Returns the folders of the conversations
+def writeArchive(archivePath, conversationCount=10, participantCount=1, messageCount=10000, days=365 * 8, wordsPerMessage=8,
+                 startDate=datetime.date(2011, 8, 9), seed=0):
+    rng = np.random.default_rng(seed)
+    startMs = int(datetime.datetime(startDate.year, startDate.month, startDate.day, tzinfo=datetime.timezone.utc).timestamp() * 1000)
+    folders = []
+
+    with zipfile.ZipFile(archivePath, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for convIndex in range(conversationCount):
+            participants = ['Participant ' + str(convIndex) + '-' + str(index) for index in range(participantCount)] + [SELF_NAME]
+            folder = 'conversation' + str(convIndex) + '_' + format(int(rng.integers(0, 1 << 40)), 'x')
+            folders.append(folder)
+
+            # Shards hold the newest messages first
+            messages = syntheticMessages(rng, participants, messageCount, startMs, days, wordsPerMessage)[::-1]
+
+            for shardIndex in range(max((len(messages) + SHARD_SIZE - 1) // SHARD_SIZE, 1)):
+                shard = {'participants': [{'name': name} for name in participants],
+                         'messages': messages[shardIndex * SHARD_SIZE:(shardIndex + 1) * SHARD_SIZE],
+                         'title': ', '.join(participants[:-1]),
+                         'is_still_participant': True,
+                         'thread_type': 'Regular' if participantCount == 1 else 'RegularGroup',
+                         'thread_path': 'inbox/' + folder}
+
+                archive.writestr('messages/inbox/' + folder + '/message_' + str(shardIndex + 1) + '.json', json.dumps(shard, indent=2))
+
+    return folders
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic Facebook Messenger archive')
+    parser.add_argument('archive', help='.zip file to write')
+    parser.add_argument('--conversations', type=int, default=10, help='number of conversations (default: 10)')
+    parser.add_argument('--participants', type=int, default=1, help='other participants per conversation (default: 1)')
+    parser.add_argument('--messages', type=int, default=10000, help='messages per conversation (default: 10000)')
+    parser.add_argument('--days', type=int, default=365 * 8, help='days the messages are spread over (default: 2920)')
+    parser.add_argument('--words', type=float, default=8, help='average words per message (default: 8)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+    args = parser.parse_args()
+
+    writeArchive(args.archive, args.conversations, args.participants, args.messages, args.days, args.words, seed=args.seed)
@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+
+'''
+Author: Jonathan Chow
+Date Modified: 2026-10-18
+Python Version: 3.7
+
+Per day counters of a MessageTable shared by the per day features
+
+The distinct days of the messages are found once, along with the index of the day of each message, and every count is a
+single bincount over a flat (day, sender) cell index built from them. The arrays only have rows for the days with
+counted messages (and, for word counts, only columns for the senders asked for), so a table with many participants
+spread over many years does not allocate a cell for every day and participant. The number of messages and of words each
+sender sent per day are kept once computed; counts of specific words and of the messages sent to each participant are
+computed on request.
+'''
+
+
+# Weighted bincounts are float64, except of no values where numpy returns int64
+def asCounts(counts):
+    return counts.astype(np.float64, copy=False)
+
+
+class DailyCounts:
+    def __init__(self, table):
+        self.table = table
+        self.participants = table.participants
+        self.senderCount = len(table.participants)
+
+        # Distinct day numbers (sorted) and the index of the day of each message among them
+        self.days, self.dayIndex = np.unique(table.dayNumbers, return_inverse=True)
+        self.dayIndex = self.dayIndex.ravel()
+
+        self.messageCounts = None
+        self.wordCounts = None
+
+    # Frame of a (day, ...) array with a row for each of days (day numbers)
+    def frame(self, days, values, columns):
+        return pd.DataFrame(values, index=pd.DatetimeIndex(days.astype('datetime64[D]')), columns=columns, copy=False)
+
+    # Days (day numbers) of some day indices and the row of each index among those days
+    def compactDays(self, dayIndex):
+        present = np.bincount(dayIndex, minlength=len(self.days)) > 0
+        return self.days[present], (np.cumsum(present) - 1)[dayIndex]
+
+    # Sum of weights (1 by default) of the messages in mask of each sender per day, on the days with messages in mask
+    # Returns the days and a (day, sender) float64 array
+    def senderSums(self, mask=None, weights=None):
+        dayIndex, sender = self.dayIndex, self.table.sender
+
+        if weights is None:
+            weights = np.ones(len(sender))
+
+        if mask is not None:
+            dayIndex, sender, weights = dayIndex[mask], sender[mask], weights[mask]
+
+        days, rows = self.compactDays(dayIndex)
+        sums = np.bincount(rows * self.senderCount + sender, weights=weights, minlength=len(days) * self.senderCount)
+
+        return days, asCounts(sums).reshape(len(days), self.senderCount)
+
+    # Number of messages each sender sent per day, on the days with messages, as the days and a (day, sender) float64 array
+    def senderMessages(self):
+        if self.messageCounts is None:
+            self.messageCounts = self.senderSums()
+
+        return self.messageCounts
+
+    # Number of words each sender sent per day, on the days with messages that have content, as the days and a
+    # (day, sender) int64 array
+    def senderWords(self):
+        if self.wordCounts is None:
+            days, sums = self.senderSums(self.table.hasContent, self.table.wordCount)
+            self.wordCounts = days, sums.astype(np.int64)
+
+        return self.wordCounts
+
+    # Number of times each of senders (codes, every sender by default) used each of words per day, on the days when any of
+    # them used any of the words
+    # Returns the days and a (day, sender, word) float64 array
+    def countWords(self, words, senders=None):
+        vocabulary = self.table.vocabulary()
+        wordIds = vocabulary.wordIds(words)
+        senders = np.arange(self.senderCount) if senders is None else np.asarray(senders)
+
+        # Position of each vocabulary word in words and of each sender in senders (-1 for those not asked for)
+        wordPositions = np.full(len(vocabulary) + 1, -1, dtype=np.int32)
+        wordPositions[wordIds[wordIds >= 0]] = np.flatnonzero(wordIds >= 0)
+        senderPositions = np.full(self.senderCount, -1, dtype=np.int32)
+        senderPositions[senders] = np.arange(len(senders))
+
+        wordPositions = wordPositions[vocabulary.word]
+        senderPositions = senderPositions[vocabulary.sender]
+        mask = (wordPositions >= 0) & (senderPositions >= 0)
+
+        # Words are counted per day of the messages they are in, so their days are among the days of the messages
+        days, rows = self.compactDays(np.searchsorted(self.days, vocabulary.day[mask]))
+        cells = (rows * len(senders) + senderPositions[mask]) * len(words) + wordPositions[mask]
+        counts = np.bincount(cells, weights=vocabulary.count[mask], minlength=len(days) * len(senders) * len(words))
+
+        return days, asCounts(counts).reshape(len(days), len(senders), len(words))
+
+    # Number of messages a sender sent to each participant per day, on the days the sender sent messages
+    # Messages sent to group chats are counted once for each participant in the chat (including the sender)
+    # Returns the days and a (day, participant) float64 array
+    def sentTo(self, senderCode):
+        mask = self.table.sender == senderCode
+        conversationCount = len(self.table.conversationParticipants)
+
+        days, rows = self.compactDays(self.dayIndex[mask])
+        cells = rows * conversationCount + self.table.conversation[mask]
+        sent = np.bincount(cells, minlength=len(days) * conversationCount).reshape(len(days), conversationCount)
+
+        # Number of times each participant appears in each conversation
+        membership = np.zeros((conversationCount, self.senderCount))
+        for convIndex, participantCodes in enumerate(self.table.conversationParticipants):
+            np.add.at(membership[convIndex], participantCodes, 1)
+
+        return days, sent.dot(membership)
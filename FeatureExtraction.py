@@ -1,274 +1,411 @@
 import datetime
+import numpy as np
 import pandas as pd
-import re
-from Graphing import *
+from Gaps import SESSION_GAP_MS, detectSessions, latencyHistogram, latencyPercentiles, responseLatencies, threadEnds
+from Instrumentation import stage
+from MessageTable import *
+from Vocabulary import topValues
 
 
 '''
 Author: Jonathan Chow
-Date Modified: 2020-01-20
+Date Modified: 2026-10-18
 Python Version: 3.7
 
 Functions for extracting features from conversation data
 
-Note that all times are GMT. However, conversation participants are not in consistent timezones (and change timezones).
+Each feature is split into an aggregate computed from a MessageTable (see MessageTable.py) and a function that turns
+the aggregate into the feature's DataFrames or Series (written as data or graphs by FeatureSinks.py). Aggregates of
+consecutive runs of messages can be merged (see IncrementalAnalysis.py).
+Times are in the timezone of the table (UTC unless set with MessageTable.setTimezone). However, conversation participants
+are not in consistent timezones (and change timezones).
 Some of the code is redundant and could be cleaned up.
 '''
 
 
-# Convert milliseconds (from start of unix time) to date
-def ms2dt(milliseconds):
-    s = milliseconds / 1000.0
-    return datetime.datetime.fromtimestamp(s)
+# Features of a single conversation
+SPECIFIC_FEATURES = ['messagesPerDay', 'wordsPerDay', 'cumMessageDiff', 'cumWordDiff', 'avgWordsPerMessage', 'convInterest', 'commonWords',
+                     'responseLatency', 'sessions']
 
+WORDS_OF_INTEREST = ['interesting', 'nice', 'sorry', 'lol', 'lmao', 'neat', 'omg', 'hmm', 'fair', 'yeah']
+PRONOUNS = ['i', 'you']
 
-def featureDict2DF(featureDict, self):
-    featureDF = pd.DataFrame()
 
-    for participant in featureDict:
-        temp = pd.DataFrame(featureDict[participant], index=[participant]).transpose()
-        featureDF = pd.concat([featureDF, temp], sort=True, ignore_index=False, axis=1)
+# Build a frame with a column for every participant from (index, sender, value) triples of the messages in mask
+# The triples are grouped and unstacked once; repeated (index, sender) pairs are combined with aggregate and pairs that
+# do not occur are set to fillValue
+def participantFrame(table, index, values, mask=None, aggregate='sum', fillValue=0):
+    sender = table.sender
+
+    if mask is not None:
+        index, sender, values = index[mask], sender[mask], values[mask]
+
+    featureDF = pd.Series(values).groupby([index, sender]).agg(aggregate).unstack(fill_value=fillValue)
+    featureDF.columns = [table.participants[code] for code in featureDF.columns]
+
+    return featureDF.reindex(columns=table.participants, fill_value=fillValue)
 
-    otherParticipants = list(featureDF.columns)
-    otherParticipants.remove(self)
-    otherParticipants.sort(key=str.lower)
 
-    featureDF = featureDF[otherParticipants + [self]]
+# Build a frame with a column for every participant from the values of the messages in mask at each time they were sent
+# Messages are grouped by timestamp and indexed by their time with its timezone, as the local times of two messages in the
+# hour repeated when DST ends can be equal
+def participantTimeFrame(table, values, mask=None, aggregate='sum', fillValue=0):
+    featureDF = participantFrame(table, np.asarray(table.timestampMs), values, mask, aggregate, fillValue)
+    featureDF.index = table.zonedTimes(featureDF.index.values)
 
     return featureDF
 
 
-# Construct timeseries of the number of messages sent per day for each participant
-def messagesPerDay(conversationList, featureDict, outputPath, self, indOrGroup):
-    for conversation in conversationList:
-        for message in conversation['messages']:
-            try:
-                featureDict[message['sender_name']][ms2dt(message['timestamp_ms']).date()] += 1
-            except KeyError:
-                featureDict[message['sender_name']][ms2dt(message['timestamp_ms']).date()] = 1
+# Drop the timezone from an index of times, leaving the local times (as in MessageTable.datetimes)
+def localTimes(featureData):
+    return featureData.set_axis(featureData.index.tz_localize(None), axis=0)
 
-    featureDF = featureDict2DF(featureDict, self)
 
-    # Add zeros for dates when a party sent no messages
-    featureDF = featureDF.fillna(0)
+# Order columns as the other participants (alphabetically) followed by me
+def orderParticipantColumns(featureDF, self):
+    otherParticipants = [participant for participant in featureDF.columns if participant != self]
+    otherParticipants.sort(key=str.lower)
 
-    # Add missing dates as zeros for all parties
-    idx = pd.date_range(list(featureDF.index)[0], list(featureDF.index)[-1])
-    featureDF = featureDF.reindex(idx, fill_value=0)
+    return featureDF[otherParticipants + [self]]
 
-    if indOrGroup == 'Individual':
-        graphReflectedTimeSeries(featureDF, 'Number of Messages', outputPath, self)
-    else:
-        graphOverlappingTimeSeries(featureDF, 'Number of Messages', outputPath)
 
+# Add missing dates as zeros for all parties (a frame without rows is returned as it is)
+def fillMissingDates(featureDF):
+    if len(featureDF) == 0:
+        return featureDF
 
-# Make timeseries of the number of words sent per day for each participant
-def wordsPerDay(conversationList, featureDict, outputPath, self, indOrGroup):
-    for conversation in conversationList:
-        for message in conversation['messages']:
-            if 'content' in message:
-                try:
-                    featureDict[message['sender_name']][ms2dt(message['timestamp_ms']).date()] += len(message['content'].split(' '))
-                except KeyError:
-                    featureDict[message['sender_name']][ms2dt(message['timestamp_ms']).date()] = len(message['content'].split(' '))
+    idx = pd.date_range(featureDF.index[0], featureDF.index[-1])
+    return featureDF.reindex(idx, fill_value=0)
 
-    featureDF = featureDict2DF(featureDict, self)
 
-    # Add zeros for dates when a party sent no messages
-    featureDF = featureDF.fillna(0)
+# Merge aggregates of per day counts (days on the boundary between the two runs of messages are summed)
+def mergeDaily(featureDF, newFeatureDF):
+    return featureDF.add(newFeatureDF, fill_value=0)
 
-    # Add missing dates as zeros for all parties
-    idx = pd.date_range(list(featureDF.index)[0], list(featureDF.index)[-1])
-    featureDF = featureDF.reindex(idx, fill_value=0)
 
-    if indOrGroup == 'Individual':
-        graphReflectedTimeSeries(featureDF, 'Number of Words', outputPath, self)
-    else:
-        graphOverlappingTimeSeries(featureDF, 'Number of Words', outputPath)
+# Extend cumulative sums with the cumulative sums of later messages
+def mergeCumulative(featureDF, newFeatureDF):
+    if len(featureDF) > 0 and len(newFeatureDF) > 0 and newFeatureDF.index[0] <= featureDF.index[-1]:
+        raise ValueError('Cumulative aggregates can only be extended with later messages')
 
+    columns = featureDF.columns.union(newFeatureDF.columns, sort=False)
+    featureDF = featureDF.reindex(columns=columns, fill_value=0)
+    newFeatureDF = newFeatureDF.reindex(columns=columns, fill_value=0)
 
-# Make timeseries of the cumulative word difference between me and average words sent by other participants
-def cumWordDiff(conversationList, featureDict, outputPath, self):
-    for conversation in conversationList:
-        for message in conversation['messages']:
-            if 'content' in message:
-                featureDict[message['sender_name']][ms2dt(message['timestamp_ms'])] = len(message['content'].split(' '))
+    if len(featureDF) > 0:
+        newFeatureDF = newFeatureDF + featureDF.iloc[-1]
 
-    featureDF = featureDict2DF(featureDict, self)
+    return pd.concat([featureDF, newFeatureDF])
 
-    # Add zeros for dates when one party sent no messages
-    featureDF = featureDF.fillna(0)
-    featureDF['Average'] = featureDF.loc[:, featureDF.columns != self].mean(axis=1)
-    featureDF = featureDF.cumsum()
-    featureSeries = featureDF[self] - featureDF['Average']
 
-    graphSeries(featureSeries, 'Cumulative Word Difference (Self - Other Participant(s) Average)', outputPath)
+# Merge aggregates of values listed in time order
+def mergeSeries(featureSeries, newFeatureSeries):
+    return pd.concat([featureSeries, newFeatureSeries]).sort_index(kind='mergesort')
 
 
-# Make timeseries of the cumulative message difference between me and average words sent by other participants
-def cumMessageDiff(conversationList, featureDict, outputPath, self):
-    for conversation in conversationList:
-        for message in conversation['messages']:
-            featureDict[message['sender_name']][ms2dt(message['timestamp_ms'])] = 1
+# Merge aggregates of reply latencies, adding the replies of the first message of each thread in the later run to the last
+# message of the thread in the earlier run (which each run on its own takes as the start of the thread)
+def mergeLatencies(aggregate, newAggregate):
+    endDF, newEndDF = aggregate['threads'], newAggregate['threads']
+    threads = endDF.index.intersection(newEndDF.index)
+    lastDF, firstDF = endDF.loc[threads], newEndDF.loc[threads]
 
-    featureDF = featureDict2DF(featureDict, self)
+    replies = firstDF['firstSender'].values != lastDF['lastSender'].values
+    replyDF = pd.DataFrame({'thread': threads[replies],
+                            'responder': firstDF['firstSender'].values[replies],
+                            'respondedTo': lastDF['lastSender'].values[replies],
+                            'latencyMs': (firstDF['firstMs'].values - lastDF['lastMs'].values)[replies]},
+                           index=pd.DatetimeIndex(firstDF['firstTime'].values[replies]))
 
-    # Add zeros for dates when one party sent no messages
-    featureDF = featureDF.fillna(0)
-    featureDF['Average'] = featureDF.loc[:, featureDF.columns != self].mean(axis=1)
-    featureDF = featureDF.cumsum()
-    featureSeries = featureDF[self] - featureDF['Average']
+    # Threads start as in the earlier run and end as in the later run
+    endDF = pd.concat([endDF, newEndDF[~newEndDF.index.isin(endDF.index)]])
+    endDF.loc[threads, ['lastMs', 'lastSender']] = newEndDF.loc[threads, ['lastMs', 'lastSender']].values
 
-    graphSeries(featureSeries, 'Cumulative Message Difference (Self - Other Participant(s) Average)', outputPath)
+    return {'latencies': mergeSeries(aggregate['latencies'], pd.concat([replyDF, newAggregate['latencies']])),
+            'threads': endDF}
 
 
-# Construct timeseries of the running average number of words per message sent for each participant
-def avgWordsPerMessage(conversationList, featureDict, outputPath, self):
-    for conversation in conversationList:
-        for message in conversation['messages']:
-            if 'content' in message:
-                featureDict[message['sender_name']][ms2dt(message['timestamp_ms'])] = len(message['content'].split(' '))
+# Merge aggregates of sessions, joining the last session of each thread in the earlier run with the first session of the
+# thread in the later run when it starts no more than SESSION_GAP_MS after the earlier one ends
+def mergeSessions(sessionDF, newSessionDF):
+    # Positions of the last session of each thread in the earlier run and of the first session in the later run
+    lastSessions = pd.Series(sessionDF['startMs'].values).groupby(sessionDF['thread'].values).idxmax()
+    firstSessions = pd.Series(newSessionDF['startMs'].values).groupby(newSessionDF['thread'].values).idxmin()
 
-    featureDF = featureDict2DF(featureDict, self)
+    threads = lastSessions.index.intersection(firstSessions.index)
+    last, first = lastSessions[threads].values, firstSessions[threads].values
 
-    # Get the running average of words per message
-    featureDF = featureDF.expanding().mean()
+    joined = newSessionDF['startMs'].values[first] - sessionDF['endMs'].values[last] <= SESSION_GAP_MS
+    last, first = last[joined], first[joined]
 
-    graphOverlappingTimeSeries(featureDF, 'Running Average of Words Per Message', outputPath)
+    endMs, messages = sessionDF['endMs'].values.copy(), sessionDF['messages'].values.copy()
+    endMs[last] = newSessionDF['endMs'].values[first]
+    messages[last] += newSessionDF['messages'].values[first]
 
+    newSessions = np.ones(len(newSessionDF), dtype=bool)
+    newSessions[first] = False
 
-# Construct timeseries of proportion of messages to specific participants
-# Messages sent to group chats are equivalent to sending a message to each person in the chat
-def messagesSentPerDay(conversationList, featureDict, outputPath, self):
-    for conversation in conversationList:
-        for message in conversation['messages']:
-            if message['sender_name'] == self:
-                for participant in conversation['participants']:
-                    try:
-                        featureDict[participant['name']][ms2dt(message['timestamp_ms']).date()] += 1
-                    except KeyError:
-                        featureDict[participant['name']][ms2dt(message['timestamp_ms']).date()] = 1
+    return mergeSeries(sessionDF.assign(endMs=endMs, messages=messages), newSessionDF[newSessions])
+
+
+# Merge aggregates of word counts for each participant
+def mergeWordCounts(wordCounts, newWordCounts):
+    wordCounts = dict(wordCounts)
+
+    # Words first used in the newer messages come first, as the archive lists the newest messages first
+    for participant, counts in newWordCounts.items():
+        if participant in wordCounts:
+            oldCounts = wordCounts[participant]
+            words = counts.index.append(oldCounts.index[~oldCounts.index.isin(counts.index)])
+            counts = counts.reindex(words, fill_value=0) + oldCounts.reindex(words, fill_value=0)
+
+        wordCounts[participant] = counts
+
+    return wordCounts
+
+
+# Number of messages sent per day by each participant
+def messagesPerDayAggregate(table, self):
+    counts = table.dailyCounts()
+    return counts.frame(*counts.senderMessages(), table.participants)
+
+
+# Number of words sent per day by each participant (on days with messages that have content)
+def wordsPerDayAggregate(table, self):
+    counts = table.dailyCounts()
+    return counts.frame(*counts.senderWords(), table.participants)
+
+
+# Cumulative number of messages sent by each participant at the time of every message
+def cumMessageDiffAggregate(table, self):
+    return participantTimeFrame(table, np.ones(len(table)), aggregate='last').cumsum()
+
+
+# Cumulative number of words sent by each participant at the time of every message
+def cumWordDiffAggregate(table, self):
+    return participantTimeFrame(table, table.wordCount, table.hasContent, aggregate='last').cumsum()
+
+
+# Cumulative number of words and messages sent by each participant at the time of every message
+def avgWordsPerMessageAggregate(table, self):
+    featureDF = participantTimeFrame(table, table.wordCount, table.hasContent, aggregate='last', fillValue=None)
+
+    return pd.concat([featureDF.fillna(0).cumsum(), featureDF.notna().cumsum()], axis=1, keys=['words', 'messages'])
+
+
+# Number of messages I sent per day to each participant
+def messagesSentPerDayAggregate(table, self):
+    counts = table.dailyCounts()
+    return counts.frame(*counts.sentTo(table.code(self)), table.participants)
+
+
+# Number of times I used each word of interest per day (missing when a word was not used on a day with other words)
+def cumWordUseAggregate(table, self, wordsOfInterest=WORDS_OF_INTEREST):
+    counts = table.dailyCounts()
+    days, wordCounts = counts.countWords(wordsOfInterest, [table.code(self)])
+    wordCounts[wordCounts == 0] = np.nan
+
+    return counts.frame(days, wordCounts[:, 0, :], wordsOfInterest)
+
+
+# Times at which I sent messages
+def breakLengthAggregate(table, self):
+    mask = table.sender == table.code(self)
+    return pd.Series(table.timestampMs[mask], index=table.datetimes[mask])
+
+
+# Number of times each participant used each word of wordList per day (the words 'i' and 'you' by default)
+# Missing when a participant did not use a word on a day when any of the words were used
+def convInterestAggregate(table, self, wordList=PRONOUNS):
+    counts = table.dailyCounts()
+    days, wordCounts = counts.countWords(wordList)
+    wordCounts[wordCounts == 0] = np.nan
+
+    return counts.frame(days, wordCounts.reshape(len(days), counts.senderCount * len(wordList)),
+                        [participant + '_' + word for participant in table.participants for word in wordList])
+
+
+# Number of times each participant used each word
+def commonWordsAggregate(table, self):
+    vocabulary = table.vocabulary()
+
+    # Order the words of each participant by their first use in the archive (rather than alphabetically), so words used
+    # as often keep the rank they had when counted while reading the archive
+    tokenRows = table.tokens()[1]
+    rows = table.archiveOrder()
+    lengths = table.wordCount[rows].astype(np.int64)
+    tokenOrder = np.repeat(table.tokenOffsets[rows] - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+    sender, word, count = vocabulary.senderWordCounts(table.sender[tokenRows], tokenOrder)
+
+    wordCounts = {participant: pd.Series(dtype=np.int64) for participant in table.participants}
+    senderStarts = np.searchsorted(sender, np.arange(len(table.participants) + 1))
+
+    for code, participant in enumerate(table.participants):
+        start, end = senderStarts[code], senderStarts[code + 1]
+
+        if end > start:
+            wordCounts[participant] = pd.Series(count[start:end], index=vocabulary.words[word[start:end]])
+
+    return wordCounts
+
+
+# Time each participant took to reply to another participant in each thread, indexed by the time of the reply, with the
+# first and last message of each thread (conversation folder) to find the replies between two runs of messages
+def responseLatencyAggregate(table, self):
+    latencyDF, endDF = responseLatencies(table), threadEnds(table)
+    participants, threads = np.array(table.participants, dtype=object), table.threadNames()
+
+    latencyDF = pd.DataFrame({'thread': threads[latencyDF['thread'].values],
+                              'responder': participants[latencyDF['responder'].values],
+                              'respondedTo': participants[latencyDF['respondedTo'].values],
+                              'latencyMs': latencyDF['latencyMs'].values}, index=latencyDF.index)
+
+    endDF = endDF.assign(firstSender=participants[endDF['firstSender'].values], lastSender=participants[endDF['lastSender'].values])
+    endDF.index = threads[endDF.index]
+
+    # Conversations without a thread cannot be matched with those of another run
+    return {'latencies': latencyDF, 'threads': endDF[endDF.index.notna()]}
+
+
+# Thread (conversation folder), start, end and number of messages of each session (run of messages without a 30 minute
+# gap) of each conversation
+def sessionsAggregate(table, self):
+    sessionDF = detectSessions(table)[1]
+    return sessionDF.assign(thread=table.threadNames()[sessionDF['thread'].values])
 
-    featureDF = featureDict2DF(featureDict, self)
 
-    # Add zeros for dates when a party sent no messages
-    featureDF = featureDF.fillna(0)
+# Functions to compute the aggregate of each feature from a table and to merge aggregates of consecutive messages
+FEATURE_AGGREGATES = {'messagesPerDay': (messagesPerDayAggregate, mergeDaily),
+                      'wordsPerDay': (wordsPerDayAggregate, mergeDaily),
+                      'cumMessageDiff': (cumMessageDiffAggregate, mergeCumulative),
+                      'cumWordDiff': (cumWordDiffAggregate, mergeCumulative),
+                      'avgWordsPerMessage': (avgWordsPerMessageAggregate, mergeCumulative),
+                      'messagesSentPerDay': (messagesSentPerDayAggregate, mergeDaily),
+                      'cumWordUse': (cumWordUseAggregate, mergeDaily),
+                      'breakLength': (breakLengthAggregate, mergeSeries),
+                      'convInterest': (convInterestAggregate, mergeDaily),
+                      'commonWords': (commonWordsAggregate, mergeWordCounts),
+                      'responseLatency': (responseLatencyAggregate, mergeLatencies),
+                      'sessions': (sessionsAggregate, mergeSessions)}
+
+
+def aggregateFeatures(table, self, featureNames):
+    aggregates = {}
+
+    for featureName in featureNames:
+        with stage('aggregate ' + featureName, len(table)):
+            aggregates[featureName] = FEATURE_AGGREGATES[featureName][0](table, self)
+
+    return aggregates
+
+
+def mergeFeatures(aggregates, newAggregates):
+    return {featureName: FEATURE_AGGREGATES[featureName][1](aggregates[featureName], newAggregates[featureName])
+            if featureName in aggregates else newAggregates[featureName] for featureName in newAggregates}
+
+
+# Construct timeseries of the number of messages sent per day for each participant
+def messagesPerDay(featureDF, self):
+    featureDF = orderParticipantColumns(featureDF, self)
+
+    # Add missing dates as zeros for all parties
+    featureDF = fillMissingDates(featureDF)
+
+    return {'Number of Messages': featureDF}
+
+
+# Make timeseries of the number of words sent per day for each participant
+def wordsPerDay(featureDF, self):
+    featureDF = orderParticipantColumns(featureDF, self)
+
+    # Add missing dates as zeros for all parties
+    featureDF = fillMissingDates(featureDF)
+
+    return {'Number of Words': featureDF}
+
+
+# Make timeseries of the cumulative word difference between me and average words sent by other participants
+# The cumulative sum of the average is the average of the cumulative sums
+def cumWordDiff(featureDF, self):
+    featureSeries = featureDF[self] - featureDF.loc[:, featureDF.columns != self].mean(axis=1)
+
+    return {'Cumulative Word Difference (Self - Other Participant(s) Average)': localTimes(featureSeries)}
+
+
+# Make timeseries of the cumulative message difference between me and average words sent by other participants
+def cumMessageDiff(featureDF, self):
+    featureSeries = featureDF[self] - featureDF.loc[:, featureDF.columns != self].mean(axis=1)
+
+    return {'Cumulative Message Difference (Self - Other Participant(s) Average)': localTimes(featureSeries)}
+
+
+# Construct timeseries of the running average number of words per message sent for each participant
+def avgWordsPerMessage(featureDF, self):
+    # Get the running average of words per message (missing until a participant has sent a message)
+    featureDF = featureDF['words'] / featureDF['messages']
+    featureDF = orderParticipantColumns(featureDF, self)
+
+    return {'Running Average of Words Per Message': localTimes(featureDF)}
+
+
+# Construct timeseries of proportion of messages to specific participants
+# Messages sent to group chats are equivalent to sending a message to each person in the chat
+def messagesSentPerDay(featureDF, self):
+    featureDF = orderParticipantColumns(featureDF, self)
 
     # Remove total number of messages sent
-    featureDF = featureDF.drop(self, 1)
+    featureDF = featureDF.drop(columns=self)
 
     # Create dataframe of percent of messages sent to each participant
     percentFeatureDF = featureDF.div(featureDF.sum(axis=1), axis=0)
 
     # Add missing dates as zeros for all parties
-    idx = pd.date_range(list(featureDF.index)[0], list(featureDF.index)[-1])
-    featureDF = featureDF.reindex(idx, fill_value=0)
+    featureDF = fillMissingDates(featureDF)
 
-    graphStackedTimeSeries(featureDF, 'Messages Sent Per Day (Nominal)', outputPath)
-    graphStackedTimeSeries(percentFeatureDF, 'Messages Sent Per Day (Percent)', outputPath)
+    return {'Messages Sent Per Day (Nominal)': featureDF,
+            'Messages Sent Per Day (Percent)': percentFeatureDF}
 
 
 # Construct timeseries of the cumulative number of words I use across all conversations
-def cumWordUse(conversationList, outputPath, self):
-    wordsOfInterestDict = {'interesting': {},
-                           'nice': {},
-                           'sorry': {},
-                           'lol': {},
-                           'lmao': {},
-                           'neat': {},
-                           'omg': {},
-                           'hmm': {},
-                           'fair': {},
-                           'yeah': {}}
-
-    for conversation in conversationList:
-        for message in conversation['messages']:
-            if message['sender_name'] == self and 'content' in message:
-                for word in [re.sub(r'[^\w\s]', '', rawWord.lower()) for rawWord in message['content'].split(' ')]:
-                    if word in wordsOfInterestDict:
-                        try:
-                            wordsOfInterestDict[word][ms2dt(message['timestamp_ms']).date()] += 1
-                        except KeyError:
-                            wordsOfInterestDict[word][ms2dt(message['timestamp_ms']).date()] = 1
-
-    wordsOfInterestDF = pd.DataFrame()
-
-    for word in wordsOfInterestDict:
-        temp = pd.DataFrame(wordsOfInterestDict[word], index=[word]).transpose()
-        wordsOfInterestDF = pd.concat([wordsOfInterestDF, temp], sort=True, ignore_index=False, axis=1)
-
+def cumWordUse(wordsOfInterestDF, self):
     # Add missing dates as zeros for all parties
-    idx = pd.date_range(list(wordsOfInterestDF.index)[0], list(wordsOfInterestDF.index)[-1])
-    wordsOfInterestDF = wordsOfInterestDF.reindex(idx, fill_value=0)
+    wordsOfInterestDF = fillMissingDates(wordsOfInterestDF)
 
     # Take the sum of word usage
     wordsOfInterestDF = wordsOfInterestDF.cumsum()
 
     # Fill from above for dates when no messages sent
-    wordsOfInterestDF = wordsOfInterestDF.fillna(method='ffill')
+    wordsOfInterestDF = wordsOfInterestDF.ffill()
 
     wordsOfInterestDF = wordsOfInterestDF[wordsOfInterestDF.columns.sort_values()]
 
-    graphOverlappingTimeSeries(wordsOfInterestDF, 'Cumulative Word Usage (Common Responses)', outputPath)
+    return {'Cumulative Word Usage (Common Responses)': wordsOfInterestDF}
 
 
 # Construct timeseries of breaks between messages sent across all conversations
 # TODO: The visualization of this function needs work
-def breakLength(conversationList, outputPath, self):
-    sentTimes = []
-
-    for conversation in conversationList:
-        messageList = [mssg for mssg in conversation['messages'] if mssg['sender_name'] == self]
+def breakLength(sentSeries, self):
+    featureSeries = pd.Series(np.diff(sentSeries.values) / 60000, index=sentSeries.index[:-1])
 
-        for message in messageList:
-            sentTimes.append(message['timestamp_ms'])
-
-    sentTimes.sort()
-
-    featureSeries = pd.Series([(sentTimes[sentIndex] - sentTimes[sentIndex - 1]) / 60000 for sentIndex in range(1, len(sentTimes))], sentTimes[:-1])
-    featureSeries.index = list(map(lambda x: ms2dt(x), featureSeries.index))
-
-    graphSeries(featureSeries, 'Time Between Sent Messages (Minutes)', outputPath)
+    return {'Time Between Sent Messages (Minutes)': featureSeries}
 
 
 # Construct timeseries of the cumulative nominal and relative use of words 'i' and 'you' by all participants in a conversation
-def convInterest(conversationList, featureDict, outputPath):
-    wordList = ['i', 'you']
-    featureWordDict = {}
-
-    for participant in featureDict:
-        for word in wordList:
-            featureWordDict[participant + '_' + word] = {}
-
-    for conversation in conversationList:
-        for message in conversation['messages']:
-            if 'content' in message:
-                for word in [re.sub(r'[^\w\s]', '', rawWord.lower()) for rawWord in message['content'].split(' ')]:
-                    if word in wordList:
-                        try:
-                            featureWordDict[message['sender_name'] + '_' + word][ms2dt(message['timestamp_ms']).date()] += 1
-                        except KeyError:
-                            featureWordDict[message['sender_name'] + '_' + word][ms2dt(message['timestamp_ms']).date()] = 1
-
-    featureDF = pd.DataFrame()
-
-    for participant in featureWordDict:
-        temp = pd.DataFrame(featureWordDict[participant], index=[participant]).transpose()
-        featureDF = pd.concat([featureDF, temp], sort=True, ignore_index=False, axis=1)
+def convInterest(featureDF, self, wordList=PRONOUNS):
+    participantList = [column[:-len('_' + wordList[0])] for column in featureDF.columns if column.endswith('_' + wordList[0])]
 
     # Add missing dates as zeros for all parties
-    idx = pd.date_range(list(featureDF.index)[0], list(featureDF.index)[-1])
-    featureDF = featureDF.reindex(idx, fill_value=0)
+    featureDF = fillMissingDates(featureDF)
 
     # Get the running average of words per message
     featureDF = featureDF.cumsum()
 
     # Fill from above for dates when no messages sent
-    featureDF = featureDF.fillna(method='ffill')
+    featureDF = featureDF.ffill()
 
     featureRelativeDF = pd.DataFrame()
 
-    for participant in featureDict:
+    for participant in participantList:
         currWordUse = 0
 
         for word in wordList:
@@ -280,35 +417,85 @@ def convInterest(conversationList, featureDict, outputPath):
     featureDF = featureDF[featureDF.columns.sort_values()]
     featureRelativeDF = featureRelativeDF[featureRelativeDF.columns.sort_values()]
 
-    graphOverlappingTimeSeries(featureDF, 'Cumulative Nominal Word Usage (Pronouns as Interest Proxy)', outputPath)
-    graphOverlappingTimeSeries(featureRelativeDF, 'Cumulative Relative Word Usage (Pronouns as Interest Proxy)', outputPath)
+    return {'Cumulative Nominal Word Usage (Pronouns as Interest Proxy)': featureDF,
+            'Cumulative Relative Word Usage (Pronouns as Interest Proxy)': featureRelativeDF}
+
+
+# Construct the 20 most common words used by each participant in a conversation with their frequency
+# Rows are indexed by participant and rank (participants who used no words have no rows)
+def commonWords(wordCounts, self):
+    wordFrames = []
+
+    for participant, featureSeries in wordCounts.items():
+        if len(featureSeries) == 0:
+            continue
+
+        featureSeries = featureSeries / featureSeries.sum()
+        featureSeries = topValues(featureSeries[featureSeries.index.str.len() > 0], 20)
+
+        wordFrames += [pd.DataFrame({'participant': participant,
+                                     'rank': np.arange(1, len(featureSeries) + 1),
+                                     'word': featureSeries.index,
+                                     'frequency': featureSeries.values})]
+
+    if len(wordFrames) == 0:
+        return {'Most Common Words': pd.DataFrame(columns=['word', 'frequency'],
+                                                  index=pd.MultiIndex.from_arrays([[], []], names=['participant', 'rank']))}
+
+    return {'Most Common Words': pd.concat(wordFrames).set_index(['participant', 'rank'])}
+
+
+# Construct percentiles and a histogram of the time each participant took to reply to each other participant, and
+# timeseries of the monthly median time each participant took to reply
+def responseLatency(aggregate, self):
+    latencyDF = aggregate['latencies']
+    responderCodes, responders = pd.factorize(latencyDF['responder'], sort=True)
+    respondedToCodes, respondedTo = pd.factorize(latencyDF['respondedTo'], sort=True)
+
+    # Each (responder, respondedTo) pair is a group
+    percentileDF = latencyPercentiles(latencyDF['latencyMs'].values / 60000, responderCodes * len(respondedTo) + respondedToCodes)
+    percentileDF.index = pd.MultiIndex.from_arrays([responders[percentileDF.index // len(respondedTo)], respondedTo[percentileDF.index % len(respondedTo)]],
+                                                   names=['responder', 'respondedTo'])
+
+    histogramDF = latencyHistogram(latencyDF['latencyMs'].values, responderCodes)
+    histogramDF.columns = responders[histogramDF.columns]
+
+    months = latencyDF.index.to_period('M').to_timestamp()
+    medianDF = (latencyDF['latencyMs'] / 60000).groupby([months, latencyDF['responder'].values]).median().unstack()
+
+    return {'Response Time Percentiles (Minutes)': percentileDF,
+            'Response Time Histogram': histogramDF,
+            'Median Response Time (Minutes)': medianDF}
 
 
-# Construct barchart of common words used by participants in a conversations
-def commonWords(conversationList, featureDict, outputPath, self):
-    for conversation in conversationList:
-        for message in conversation['messages']:
-            if 'content' in message:
-                for word in [re.sub(r'[^\w\s]', '', rawWord.lower()) for rawWord in message['content'].split(' ')]:
-                    try:
-                        featureDict[message['sender_name']][word] += 1.0
-                    except KeyError:
-                        featureDict[message['sender_name']][word] = 1.0
+# Construct timeseries of the number of conversation sessions per month and percentiles of their length
+def sessions(sessionDF, self):
+    months = sessionDF.index.to_period('M').to_timestamp()
+    sessionSeries = pd.Series(np.ones(len(sessionDF), dtype=np.int64), index=sessionDF.index).groupby(months).sum()
 
-    wordList = {}
+    # Durations (in minutes) and numbers of messages are percentiles of groups 0 and 1
+    lengthDF = latencyPercentiles(np.concatenate([(sessionDF['endMs'].values - sessionDF['startMs'].values) / 60000, sessionDF['messages'].values]),
+                                  np.repeat([0, 1], len(sessionDF)))
+    lengthDF.index = np.array(['minutes', 'messages'])[lengthDF.index]
 
-    for participant in featureDict:
-        totalWords = 0
+    return {'Sessions Per Month': sessionSeries,
+            'Session Length Percentiles': lengthDF}
 
-        for word, frequency in featureDict[participant].items():
-            totalWords += frequency
 
-        for word, frequency in featureDict[participant].items():
-            featureDict[participant][word] /= totalWords
+# Functions to turn the aggregate of each feature into its outputs ({title: DataFrame or Series})
+FEATURE_OUTPUTS = {'messagesPerDay': messagesPerDay,
+                   'wordsPerDay': wordsPerDay,
+                   'cumMessageDiff': cumMessageDiff,
+                   'cumWordDiff': cumWordDiff,
+                   'avgWordsPerMessage': avgWordsPerMessage,
+                   'messagesSentPerDay': messagesSentPerDay,
+                   'cumWordUse': cumWordUse,
+                   'breakLength': breakLength,
+                   'convInterest': convInterest,
+                   'commonWords': commonWords,
+                   'responseLatency': responseLatency,
+                   'sessions': sessions}
 
-        wordList[participant] = [(word, frequency) for word, frequency in featureDict[participant].items() if len(word) > 0]
-        wordList[participant].sort(key=lambda x: x[1], reverse=True)
-        # wordList[participant] = [tup for tup in wordList[participant] if len(tup[0]) >= 4]
-        wordList[participant] = wordList[participant][:20]
 
-    graphBarchart(wordList, 'Most Common Words', 'Frequency', outputPath, self)
+def featureOutputs(aggregates, self):
+    return {featureName: FEATURE_OUTPUTS[featureName](aggregate, self) for featureName, aggregate in aggregates.items()}
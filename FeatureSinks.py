@@ -0,0 +1,110 @@
+import pandas as pd
+from FeatureExtraction import FEATURE_OUTPUTS
+from Graphing import *
+from Instrumentation import stage
+
+
+'''
+Author: Jonathan Chow
+Date Modified: 2026-10-18
+Python Version: 3.7
+
+Sinks for the outputs of features (see FEATURE_OUTPUTS in FeatureExtraction.py)
+
+Every output of a feature can be written as data (CSV, JSON or Parquet, named after the output) and/or drawn as a graph,
+so the numbers can be read without paying for a render. Parquet needs pyarrow (or fastparquet) to be installed.
+'''
+
+
+DATA_FORMATS = ['csv', 'json', 'parquet']
+
+
+# Draw per participant timeseries, reflected about the x axis for individual conversations
+def participantChart(featureDF, title, outputPath, self, indOrGroup):
+    if indOrGroup == 'Individual':
+        graphReflectedTimeSeries(featureDF, title, outputPath, self)
+    else:
+        graphOverlappingTimeSeries(featureDF, title, outputPath)
+
+
+def seriesChart(featureSeries, title, outputPath, self, indOrGroup):
+    graphSeries(featureSeries, title, outputPath)
+
+
+def overlappingChart(featureDF, title, outputPath, self, indOrGroup):
+    graphOverlappingTimeSeries(featureDF, title, outputPath)
+
+
+def stackedChart(featureDF, title, outputPath, self, indOrGroup):
+    graphStackedTimeSeries(featureDF, title, outputPath)
+
+
+# Draw the (word, frequency) bars of each participant
+def barChart(wordDF, title, outputPath, self, indOrGroup):
+    wordList = {participant: list(zip(participantDF['word'], participantDF['frequency']))
+                for participant, participantDF in wordDF.groupby(level='participant', sort=False)}
+    wordList.setdefault(self, [])
+
+    graphBarchart(wordList, title, 'Frequency', outputPath, self)
+
+
+# Draw the outputs of a feature that are timeseries (other outputs are only written as data)
+def timeSeriesChart(data, title, outputPath, self, indOrGroup):
+    if not isinstance(data.index, pd.DatetimeIndex) or len(data) == 0:
+        return
+
+    if isinstance(data, pd.Series):
+        graphSeries(data, title, outputPath)
+    else:
+        graphOverlappingTimeSeries(data, title, outputPath)
+
+
+# Function drawing the outputs of each feature, called as chart(data, title, outputPath, self, indOrGroup)
+FEATURE_CHARTS = {'messagesPerDay': participantChart,
+                  'wordsPerDay': participantChart,
+                  'cumMessageDiff': seriesChart,
+                  'cumWordDiff': seriesChart,
+                  'avgWordsPerMessage': overlappingChart,
+                  'messagesSentPerDay': stackedChart,
+                  'cumWordUse': overlappingChart,
+                  'breakLength': seriesChart,
+                  'convInterest': overlappingChart,
+                  'commonWords': barChart,
+                  'responseLatency': timeSeriesChart,
+                  'sessions': timeSeriesChart}
+
+
+# Write a DataFrame or Series to path + '.' + dataFormat
+def writeData(data, path, dataFormat):
+    featureDF = data.to_frame(name=data.name if data.name is not None else 'value') if isinstance(data, pd.Series) else data
+
+    if dataFormat == 'csv':
+        featureDF.to_csv(path + '.csv')
+    elif dataFormat == 'json':
+        featureDF.to_json(path + '.json', orient='split', date_format='iso')
+    elif dataFormat == 'parquet':
+        # Parquet needs string column names
+        featureDF = featureDF.rename(columns=str)
+        featureDF.to_parquet(path + '.parquet')
+    else:
+        raise ValueError('Unknown data format: ' + dataFormat)
+
+
+# Write the outputs of features computed from aggregates in each of dataFormats and draw them if charts is True
+# indOrGroup is only used by the per conversation features, dates (the first and last date of the messages the aggregates
+# were computed from) are given in the title of the graphs
+# Outputs without rows (e.g. the words per day of a conversation of only photos) are written but not drawn
+def sinkFeatures(aggregates, outputPath, self, indOrGroup=None, dataFormats=(), charts=True, dates=None):
+    setChartDates(dates)
+
+    for featureName, aggregate in aggregates.items():
+        with stage('outputs ' + featureName):
+            outputs = FEATURE_OUTPUTS[featureName](aggregate, self)
+
+        for title, data in outputs.items():
+            for dataFormat in dataFormats:
+                with stage('write ' + title + '.' + dataFormat):
+                    writeData(data, outputPath + title, dataFormat)
+
+            if charts and len(data) > 0:
+                FEATURE_CHARTS[featureName](data, title, outputPath, self, indOrGroup)
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+
+'''
+Author: Jonathan Chow
+Date Modified: 2026-10-18
+Python Version: 3.7
+
+Gaps between messages of a MessageTable: response latency, sessions, histograms and percentiles
+
+Messages are grouped by thread (conversation folder) with one stable sort of the chronological table, after which the
+gap before every message is a single np.diff of the int64 timestamps. A reply is a message that follows a message from
+a different sender in the same thread, and a session is a run of messages of a thread without a gap longer than a
+threshold.
+'''
+
+
+SESSION_GAP_MS = 30 * 60 * 1000
+
+# Upper edges of the latency histogram bins (1, 5, 15 and 30 minutes, 1, 3, 6, 12 and 24 hours, then longer)
+LATENCY_BIN_EDGES_MS = np.array([1, 5, 15, 30, 60, 3 * 60, 6 * 60, 12 * 60, 24 * 60], dtype=np.int64) * 60000
+LATENCY_BIN_LABELS = ['< 1 minute', '< 5 minutes', '< 15 minutes', '< 30 minutes', '< 1 hour', '< 3 hours', '< 6 hours', '< 12 hours',
+                      '< 24 hours', '24 hours or more']
+
+
+# Stable argsort of non-negative integer codes (numpy radix sorts them when they fit in 16 bits)
+def sortCodes(codes):
+    if len(codes) > 0 and codes.max() < 1 << 15:
+        codes = codes.astype(np.int16)
+
+    return np.argsort(codes, kind='stable')
+
+
+# Order messages by thread (keeping each thread chronological), returning the order, the thread of each ordered message
+# and the gap (ms) before each ordered message, where gaps at the start of a thread are -1
+def threadGaps(table):
+    threads = table.threadCodes()[table.conversation]
+    order = sortCodes(threads)
+    threads = threads[order]
+
+    gaps = np.diff(np.asarray(table.timestampMs)[order], prepend=0)
+
+    if len(order) > 0:
+        gaps[np.r_[True, threads[1:] != threads[:-1]]] = -1
+
+    return order, threads, gaps
+
+
+# First and last message of each thread, as a frame indexed by thread code with the time of the first message and the
+# timestamp (ms) and sender of the first and last messages
+def threadEnds(table):
+    order, threads, gaps = threadGaps(table)
+    timestampMs, senders = np.asarray(table.timestampMs)[order], table.sender[order]
+
+    firsts = np.flatnonzero(gaps < 0)
+    lasts = np.r_[firsts[1:], len(order)][:len(firsts)] - 1
+
+    return pd.DataFrame({'firstTime': table.datetimes[order[firsts]],
+                         'firstMs': timestampMs[firsts],
+                         'firstSender': senders[firsts],
+                         'lastMs': timestampMs[lasts],
+                         'lastSender': senders[lasts]}, index=threads[firsts])
+
+
+# Time each reply took, as a frame indexed by the time of the reply with the thread, responder and participant
+# responded to (codes into table.participants) and the latency in ms
+def responseLatencies(table):
+    order, threads, gaps = threadGaps(table)
+    senders = table.sender[order]
+
+    replies = np.flatnonzero((gaps >= 0) & (senders != np.roll(senders, 1)))
+
+    return pd.DataFrame({'thread': threads[replies],
+                         'responder': senders[replies],
+                         'respondedTo': senders[replies - 1],
+                         'latencyMs': gaps[replies]}, index=table.datetimes[order[replies]])
+
+
+# Split each thread into sessions at gaps longer than gapMs, returning the session of each message (in table order) and
+# a frame of the thread, start, end and number of messages of each session indexed by its start time
+def detectSessions(table, gapMs=SESSION_GAP_MS):
+    order, threads, gaps = threadGaps(table)
+    timestampMs = np.asarray(table.timestampMs)[order]
+
+    newSession = (gaps < 0) | (gaps > gapMs)
+    starts = np.flatnonzero(newSession)
+    ends = np.r_[starts[1:], len(order)][:len(starts)] - 1
+
+    messageSessions = np.empty(len(order), dtype=np.int64)
+    messageSessions[order] = np.cumsum(newSession) - 1
+
+    sessionDF = pd.DataFrame({'thread': threads[starts],
+                              'startMs': timestampMs[starts],
+                              'endMs': timestampMs[ends],
+                              'messages': ends - starts + 1}, index=table.datetimes[order[starts]])
+
+    return messageSessions, sessionDF
+
+
+# Number of latencies in each bin of LATENCY_BIN_EDGES_MS for each group (non-negative integer codes)
+# Columns are the group codes present
+def latencyHistogram(latencyMs, groups):
+    latencyMs, groups = np.asarray(latencyMs), np.asarray(groups, dtype=np.int64)
+    groupCount = int(groups.max()) + 1 if len(groups) > 0 else 0
+
+    bins = np.searchsorted(LATENCY_BIN_EDGES_MS, latencyMs, side='right')
+    counts = np.bincount(groups * len(LATENCY_BIN_LABELS) + bins, minlength=groupCount * len(LATENCY_BIN_LABELS))
+    counts = counts.reshape(groupCount, len(LATENCY_BIN_LABELS))
+    groupCodes = np.flatnonzero(counts.any(axis=1))
+
+    return pd.DataFrame(counts[groupCodes].T, index=LATENCY_BIN_LABELS, columns=groupCodes)
+
+
+# Percentiles (linearly interpolated, as np.percentile) of the latencies of each group (non-negative integer codes)
+# with one row per group code present
+def latencyPercentiles(latencyMs, groups, percentiles=(50, 90, 99)):
+    latencyMs, groups = np.asarray(latencyMs, dtype=np.float64), np.asarray(groups, dtype=np.int64)
+
+    # Sort by latency and then stably by group so each group is a sorted run
+    order = np.argsort(latencyMs)
+    order = order[sortCodes(groups[order])]
+    latencyMs = latencyMs[order]
+
+    counts = np.bincount(groups)
+    groupCodes = np.flatnonzero(counts)
+    starts = (np.cumsum(counts) - counts)[groupCodes]
+    counts = counts[groupCodes]
+
+    percentileDF = pd.DataFrame({'count': counts}, index=groupCodes)
+
+    for percentile in percentiles:
+        position = (counts - 1) * (percentile / 100)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, counts - 1)
+
+        percentileDF['p' + str(percentile)] = latencyMs[starts + lower] + (latencyMs[starts + upper] - latencyMs[starts + lower]) * (position - lower)
+
+    return percentileDF
@@ -1,16 +1,134 @@
+import concurrent.futures
+import functools
+import itertools
 import numpy as np
-from matplotlib import pyplot as plt
+import pandas as pd
+from Instrumentation import addRecords, recordedCall, stage, workerSettings
 
 
 '''
 Author: Jonathan Chow
-Date Modified: 2020-01-20
+Date Modified: 2026-10-18
 Python Version: 3.7
 
 Functions for graphing conversation features
+
+Every graph is drawn on its own Figure with the (non-interactive) Agg canvas rather than through pyplot, so no figure is
+kept alive after it is saved. Between queueCharts() and renderCharts() graphs are queued instead of drawn, which lets
+renderCharts() draw all of the graphs of a run in a process pool. Matplotlib is only imported once a graph is drawn.
+
+The title of every graph gives the dates of the messages it was computed from (see setChartDates), which are kept with
+each queued graph.
+
+Long timeseries are decimated before they are drawn: only the first, last, smallest and largest points of each pixel
+column are kept (M4 aggregation), which draws the same line while making drawing time independent of the number of points.
 '''
 
 
+FIGURE_SIZE = (12, 5)
+FIGURE_DPI = 250
+
+# Graphs queued by the graphing functions (None when graphs are drawn immediately)
+chartQueue = None
+
+# Number of pixel columns timeseries are decimated to (None to draw every point)
+decimationWidth = FIGURE_SIZE[0] * FIGURE_DPI
+
+# First and last date of the messages graphs are drawn from (None when they are not known)
+chartDates = None
+
+
+# Set the number of pixel columns timeseries are decimated to (None to turn decimation off)
+def setDecimation(width):
+    global decimationWidth
+    decimationWidth = width
+
+
+# Set the first and last date of the messages the following graphs are drawn from (e.g. MessageTable.dateRange())
+def setChartDates(dates):
+    global chartDates
+    chartDates = dates
+
+
+# Keep the first, last, smallest and largest point of a (time ordered) series in each of decimationWidth columns
+def decimate(featureSeries):
+    if decimationWidth is None or len(featureSeries) <= 4 * decimationWidth:
+        return featureSeries
+
+    x = np.asarray(featureSeries.index.values).astype('datetime64[ns]').astype(np.int64) \
+        if isinstance(featureSeries.index, pd.DatetimeIndex) else np.asarray(featureSeries.index.values, dtype=np.float64)
+    y = np.asarray(featureSeries.values, dtype=np.float64)
+
+    # Columns are contiguous runs since the series is ordered by x
+    columns = np.minimum(((x - x[0]) / max(x[-1] - x[0], 1) * decimationWidth).astype(np.int64), decimationWidth - 1)
+    starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+    ends = np.r_[starts[1:], len(columns)] - 1
+
+    # Sorting by (column, value) puts the smallest (or largest) point of each column at the start of its run
+    missing = np.isnan(y)
+    smallest = np.lexsort((np.where(missing, np.inf, y), columns))[starts]
+    largest = np.lexsort((np.where(missing, np.inf, -y), columns))[starts]
+
+    return featureSeries.iloc[np.unique(np.concatenate([starts, ends, smallest, largest]))]
+
+
+# Queue graphs instead of drawing them until renderCharts is called
+def queueCharts():
+    global chartQueue
+    chartQueue = []
+
+
+# Draw a queued graph (in a worker process)
+def renderChart(chart):
+    graphName, args, dates = chart
+    setChartDates(dates)
+
+    with stage('chart ' + args[1]):
+        globals()[graphName].__wrapped__(*args)
+
+
+# Draw all queued graphs, using a process pool if there is more than one worker, and stop queueing
+def renderCharts(workers=1):
+    global chartQueue
+    charts, chartQueue = chartQueue or [], None
+
+    if workers == 1 or len(charts) <= 1:
+        for chart in charts:
+            renderChart(chart)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=setDecimation, initargs=(decimationWidth,)) as pool:
+        for _, records in pool.map(recordedCall, itertools.repeat(workerSettings()), itertools.repeat(renderChart), charts):
+            addRecords(records)
+
+
+# Queue calls to a graphing function while charts are being queued
+def queueable(graph):
+    @functools.wraps(graph)
+    def queueOrGraph(*args):
+        if chartQueue is not None:
+            chartQueue.append((graph.__name__, args, chartDates))
+        else:
+            renderChart((graph.__name__, args, chartDates))
+
+    return queueOrGraph
+
+
+def newFigure(yAxisName):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=FIGURE_SIZE, dpi=FIGURE_DPI)
+    FigureCanvasAgg(figure)
+
+    axes = figure.subplots()
+    axes.set_xlabel('Date')
+    axes.set_ylabel(yAxisName)
+    axes.set_title('Analysis of Facebook Messages' + (' ({} to {})'.format(*chartDates) if chartDates is not None else ''))
+
+    return figure, axes
+
+
 # Get range of colours from 'darkblue' to 'tomato'
 def list2Colour(listLen):
     startColour = (0.0, 0.0, 0.5450980392156862)
@@ -22,97 +140,102 @@ def list2Colour(listLen):
 
 
 # Graph two timeseries
+@queueable
 def graphReflectedTimeSeries(featureDF, yAxisName, savePath, selfName):
     # Reflect the feature corresponding to me
+    featureDF = featureDF.copy()
     featureDF[selfName] = -featureDF[selfName]
 
-    plt.figure(figsize=(12, 5), dpi=250)
-    plt.xlabel('Date')
-    plt.ylabel(yAxisName)
-    plt.title('Analysis of Facebook Messages (2011-08-09 to 2020-01-20)')
+    figure, axes = newFigure(yAxisName)
 
-    plt.plot(list(featureDF.index), featureDF.loc[:, featureDF.columns != selfName],
-             color='darkblue', label=[x for x in featureDF.columns if x != selfName][0])
-    plt.plot(list(featureDF.index), featureDF[selfName],
-             color='tomato', label=selfName)
+    otherParticipants = [x for x in featureDF.columns if x != selfName]
 
-    plt.grid(True)
+    for participantIndex in range(0, len(otherParticipants)):
+        featureSeries = decimate(featureDF[otherParticipants[participantIndex]])
+        axes.plot(list(featureSeries.index), featureSeries,
+                  color='darkblue', label=otherParticipants[0] if participantIndex == 0 else '_nolegend_')
+
+    featureSeries = decimate(featureDF[selfName])
+    axes.plot(list(featureSeries.index), featureSeries,
+              color='tomato', label=selfName)
+
+    axes.grid(True)
 
     # Set the y axis such that the scale is the same for both +/-
-    maxYAxis = max([abs(x) for x in plt.gca().get_ylim()])
-    plt.ylim(-maxYAxis, maxYAxis)
+    maxYAxis = max([abs(x) for x in axes.get_ylim()])
+    axes.set_ylim(-maxYAxis, maxYAxis)
 
     # Change the negative values to positive for aesthetics
-    yLabels = [int(abs(x)) for x in plt.gca().get_yticks().tolist()]
-    plt.gca().set_yticklabels(yLabels)
+    yLabels = [int(abs(x)) for x in axes.get_yticks().tolist()]
+    axes.set_yticklabels(yLabels)
 
-    handles, labels = plt.gca().get_legend_handles_labels()
+    handles, labels = axes.get_legend_handles_labels()
 
-    plt.legend(handles, labels, loc='upper left')
-    plt.savefig(savePath + yAxisName + '.png')
+    axes.legend(handles, labels, loc='upper left')
+    figure.savefig(savePath + yAxisName + '.png')
 
 
 # Graph single timeseries
+@queueable
 def graphSeries(featureSeries, yAxisName, savePath):
-    plt.figure(figsize=(12, 5), dpi=250)
-    plt.xlabel('Date')
-    plt.ylabel(yAxisName)
-    plt.title('Analysis of Facebook Messages (2011-08-09 to 2020-01-20)')
-    plt.plot(list(featureSeries.index), featureSeries, color='darkblue')
-    plt.grid(True)
-    plt.savefig(savePath + yAxisName + '.png')
+    figure, axes = newFigure(yAxisName)
+
+    featureSeries = decimate(featureSeries)
+    axes.plot(list(featureSeries.index), featureSeries, color='darkblue')
+    axes.grid(True)
+
+    figure.savefig(savePath + yAxisName + '.png')
 
 
 # Graph n overlapping timeseries
+@queueable
 def graphOverlappingTimeSeries(featureDF, yAxisName, savePath):
-    plt.figure(figsize=(12, 5), dpi=250)
-    plt.xlabel('Date')
-    plt.ylabel(yAxisName)
-    plt.title('Analysis of Facebook Messages (2011-08-09 to 2020-01-20)')
+    figure, axes = newFigure(yAxisName)
 
     colourList = list2Colour(len(featureDF.columns))
 
     for participantIndex in range(0, len(featureDF.columns)):
-        plt.plot(list(featureDF.index), featureDF.iloc[:, participantIndex],
-                 color=colourList[participantIndex], label=featureDF.columns[participantIndex])
+        featureSeries = decimate(featureDF.iloc[:, participantIndex])
+        axes.plot(list(featureSeries.index), featureSeries,
+                  color=colourList[participantIndex], label=featureDF.columns[participantIndex])
 
-    plt.grid(True)
+    axes.grid(True)
 
-    handles, labels = plt.gca().get_legend_handles_labels()
+    handles, labels = axes.get_legend_handles_labels()
 
-    plt.legend(handles, labels, loc='upper left')
-    plt.savefig(savePath + yAxisName + '.png')
+    axes.legend(handles, labels, loc='upper left')
+    figure.savefig(savePath + yAxisName + '.png')
 
 
 # Graph n stacked timeseries
+@queueable
 def graphStackedTimeSeries(featureDF, yAxisName, savePath):
-    plt.figure(figsize=(12, 5), dpi=250)
-    plt.xlabel('Date')
-    plt.ylabel(yAxisName)
-    plt.title('Analysis of Facebook Messages (2011-08-09 to 2020-01-20)')
+    figure, axes = newFigure(yAxisName)
 
     colourList = list2Colour(len(featureDF.columns))
 
-    plt.stackplot(list(featureDF.index), featureDF.transpose().values.tolist(), colors=colourList, labels=featureDF.columns)
+    axes.stackplot(list(featureDF.index), featureDF.transpose().values.tolist(), colors=colourList, labels=featureDF.columns)
 
-    plt.grid(True)
+    axes.grid(True)
 
-    handles, labels = plt.gca().get_legend_handles_labels()
+    handles, labels = axes.get_legend_handles_labels()
 
-    plt.legend(handles, labels, loc='upper left')
-    plt.savefig(savePath + yAxisName + '.png')
+    axes.legend(handles, labels, loc='upper left')
+    figure.savefig(savePath + yAxisName + '.png')
 
 
 # Graph n barcharts
+@queueable
 def graphBarchart(featureDict, xAxisName, yAxisName, savePath, selfName):
     labels = list(range(1, len(featureDict[selfName]) + 1))
+
+    # Participants with fewer (e.g. no) values than me get empty bars
+    featureDict = {participant: (values + [('', 0)] * len(labels))[:len(labels)] for participant, values in featureDict.items()}
     x = np.arange(0, len(labels))
     width = 0.9 / len(featureDict)
 
-    plt.figure(figsize=(12, 5), dpi=250)
-    plt.xlabel(xAxisName)
-    plt.ylabel(yAxisName)
-    plt.title('Analysis of Facebook Messages (2011-08-09 to 2020-01-20)')
+    figure, axes = newFigure(yAxisName)
+    axes.set_xlabel(xAxisName)
 
     colourList = list2Colour(len(featureDict))
 
@@ -120,21 +243,21 @@ def graphBarchart(featureDict, xAxisName, yAxisName, savePath, selfName):
     participantBars = []
 
     for participant in sorted([part for part in featureDict if part != selfName]):
-        participantBars += [(participant, plt.gca().bar(x + (width / 2) + (width * participantIndex),
-                                                        [x[1] for x in featureDict[participant]],
-                                                        width, color=colourList[participantIndex], label=participant))]
+        participantBars += [(participant, axes.bar(x + (width / 2) + (width * participantIndex),
+                                                   [x[1] for x in featureDict[participant]],
+                                                   width, color=colourList[participantIndex], label=participant))]
         participantIndex += 1
 
-    participantBars += [(selfName, plt.gca().bar(x + (width / 2) + (width * participantIndex),
-                                                    [x[1] for x in featureDict[selfName]],
-                                                    width, color=colourList[participantIndex], label=selfName))]
+    participantBars += [(selfName, axes.bar(x + (width / 2) + (width * participantIndex),
+                                            [x[1] for x in featureDict[selfName]],
+                                            width, color=colourList[participantIndex], label=selfName))]
 
-    plt.gca().set_xticks(x)
-    plt.gca().set_xticklabels(labels)
+    axes.set_xticks(x)
+    axes.set_xticklabels(labels)
 
-    handles, labels = plt.gca().get_legend_handles_labels()
+    handles, labels = axes.get_legend_handles_labels()
 
-    plt.legend(handles, labels, loc='upper right')
+    axes.legend(handles, labels, loc='upper right')
 
     for participant in participantBars:
         participantIndex = 0
@@ -142,12 +265,12 @@ def graphBarchart(featureDict, xAxisName, yAxisName, savePath, selfName):
         for rect in participant[1]:
             height = rect.get_height()
 
-            plt.gca().annotate(featureDict[participant[0]][participantIndex][0],
-                               xy=(rect.get_x() + rect.get_width() / 2, height),
-                               xytext=(0, 1),  # 3 points vertical offset
-                               textcoords='offset points',
-                               ha='center', va='bottom', fontsize=5)
+            axes.annotate(featureDict[participant[0]][participantIndex][0],
+                          xy=(rect.get_x() + rect.get_width() / 2, height),
+                          xytext=(0, 1),  # 3 points vertical offset
+                          textcoords='offset points',
+                          ha='center', va='bottom', fontsize=5)
 
             participantIndex += 1
 
-    plt.savefig(savePath + xAxisName + '.png')
+    figure.savefig(savePath + xAxisName + '.png')
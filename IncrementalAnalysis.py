@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import shutil
+import zipfile
+import pandas as pd
+from pathlib import Path
+from ArchiveReader import readConversations, shardFolder
+from FeatureExtraction import aggregateFeatures, mergeFeatures
+from Instrumentation import stage
+from MessageTable import MessageTableBuilder
+
+
+'''
+Author: Jonathan Chow
+Date Modified: 2026-10-18
+Python Version: 3.7
+
+Incremental analysis of successive Facebook Messenger exports
+
+The aggregates of each feature (see FEATURE_AGGREGATES in FeatureExtraction.py) are stored along with the timestamp of
+the latest message read from each conversation folder (its high-water mark). When a newer export is given only the
+messages after those marks are read, and their aggregates are merged into the stored ones. Per day counts are summed and
+cumulative series are extended from their last value rather than recomputed. Replies and sessions that span the two runs
+are joined up from the first and last messages of each thread.
+'''
+
+
+# Version of the stored aggregates, stores of another version are rebuilt from the whole archive (increment it whenever
+# messages are read differently, e.g. names repaired by ArchiveReader.py, or the aggregates change)
+STORE_VERSION = 4
+
+
+def storePath(storeDir, folders, self):
+    key = hashlib.sha256(self.encode())
+
+    for folder in folders:
+        key.update(b'\0' + folder.encode())
+
+    return Path(storeDir) / key.hexdigest()
+
+
+def readStore(path):
+    try:
+        with open(path / 'state.json', 'r') as stateFile:
+            state = json.load(stateFile)
+    except (FileNotFoundError, ValueError):
+        return {'highWaterMarks': {}, 'features': []}, {}
+
+    return state, pd.read_pickle(path / 'aggregates.pkl')
+
+
+def writeStore(path, state, aggregates):
+    tempPath = path.with_suffix('.tmp')
+    shutil.rmtree(tempPath, ignore_errors=True)
+    tempPath.mkdir(parents=True)
+
+    pd.to_pickle(aggregates, tempPath / 'aggregates.pkl')
+
+    with open(tempPath / 'state.json', 'w') as stateFile:
+        json.dump(state, stateFile, indent=2)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tempPath, path)
+
+
+# Read the messages of each folder sent after its high-water mark, returning them with the updated marks
+def readNewMessages(archivePath, folders, highWaterMarks, workers=1, timezone='UTC', participantTimezones=None):
+    builder = MessageTableBuilder()
+
+    with stage('open archive'):
+        archive = zipfile.ZipFile(archivePath, 'r')
+
+    with archive:
+        shardIDs = readConversations(archive, folders, builder, workers, highWaterMarks)
+
+    with stage('build table', len(builder.timestampMs)):
+        table = builder.build()
+
+    table.setTimezone(timezone, participantTimezones)
+
+    highWaterMarks = dict(highWaterMarks)
+    shardMarks = pd.Series(table.timestampMs).groupby(table.conversation).max()
+
+    for convIndex, highWaterMark in shardMarks.items():
+        folder = shardFolder(shardIDs[convIndex])
+        highWaterMarks[folder] = max(highWaterMarks.get(folder, highWaterMark), int(highWaterMark))
+
+    return table, highWaterMarks
+
+
+# Bring the stored aggregates of the given features up to date with an archive and return them (None if the folders have
+# no messages)
+# If a feature has not been stored before (or the timezones or STORE_VERSION changed) the aggregates are rebuilt from the
+# whole archive
+def updateAggregates(archivePath, folders, self, featureNames, storeDir='Incremental/', workers=1, timezone='UTC', participantTimezones=None):
+    path = storePath(storeDir, folders, self)
+    state, aggregates = readStore(path)
+
+    timezones = {'timezone': timezone, 'participantTimezones': dict(participantTimezones or {})}
+
+    if (not set(featureNames).issubset(state['features']) or state.get('timezones', timezones) != timezones
+            or state.get('version') != STORE_VERSION):
+        state, aggregates = {'highWaterMarks': {}, 'features': sorted(set(featureNames) | set(state['features']))}, {}
+
+    state['version'] = STORE_VERSION
+    state['timezones'] = timezones
+    table, state['highWaterMarks'] = readNewMessages(archivePath, folders, state['highWaterMarks'], workers, timezone, participantTimezones)
+
+    if len(table) > 0:
+        aggregates = mergeFeatures(aggregates, aggregateFeatures(table, self, state['features']))
+        writeStore(path, state, aggregates)
+
+    # Nothing has been stored if no messages have ever been read
+    if len(aggregates) == 0:
+        return None
+
+    return {featureName: aggregates[featureName] for featureName in featureNames}
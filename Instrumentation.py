@@ -0,0 +1,157 @@
+import contextlib
+import cProfile
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:
+    # resource is Unix only, peak RSS is reported as None elsewhere
+    resource = None
+
+
+'''
+Author: Jonathan Chow
+Date Modified: 2026-10-18
+Python Version: 3.7
+
+Per stage instrumentation of the analysis
+
+Between startInstrumentation() and stopInstrumentation() every stage of the pipeline (opening the archive, reading each
+shard, each feature and each graph) records its wall time, CPU time, the peak RSS of the process at its end (None where
+the resource module is not available, e.g. Windows) and, where it handles messages, messages per second. Each stage can also be profiled with cProfile into its own .pstats file.
+Stages run in worker processes are recorded there and sent back with their results (see recordedCall).
+'''
+
+
+# Stages recorded since startInstrumentation (None when stages are not recorded)
+stageRecords = None
+
+# Directory cProfile stats of each stage are written to (None to not profile)
+profileDirectory = None
+
+# Whether a stage is being profiled (only the outermost of nested stages is)
+profiling = False
+
+
+def startInstrumentation(profileDir=None):
+    global stageRecords, profileDirectory
+    stageRecords = []
+    profileDirectory = profileDir
+
+    if profileDir is not None:
+        Path(profileDir).mkdir(parents=True, exist_ok=True)
+
+
+# Stop recording stages and return the records
+def stopInstrumentation():
+    global stageRecords, profileDirectory
+    records, stageRecords, profileDirectory = stageRecords or [], None, None
+
+    return records
+
+
+# Peak resident set size of this process in bytes (ru_maxrss is in kilobytes on linux and bytes on macOS), None without
+# the resource module
+def peakRSS():
+    if resource is None:
+        return None
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+# Record the stage run in the body of the with statement, which can set record['messages'] if it is not known upfront
+@contextlib.contextmanager
+def stage(name, messageCount=None):
+    global profiling
+    record = {'stage': name}
+
+    if messageCount is not None:
+        record['messages'] = int(messageCount)
+
+    if stageRecords is None:
+        yield record
+        return
+
+    profiler = None
+
+    if profileDirectory is not None and not profiling:
+        profiler = cProfile.Profile()
+        profiling = True
+
+    wallStart, cpuStart = time.perf_counter(), time.process_time()
+
+    if profiler is not None:
+        profiler.enable()
+
+    try:
+        yield record
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiling = False
+
+        record['wall'] = time.perf_counter() - wallStart
+        record['cpu'] = time.process_time() - cpuStart
+        record['peakRSS'] = peakRSS()
+        record['pid'] = os.getpid()
+
+        if 'messages' in record:
+            record['messagesPerSecond'] = record['messages'] / record['wall'] if record['wall'] > 0 else None
+
+        if profiler is not None:
+            profilePath = Path(profileDirectory) / (str(os.getpid()) + '-' + str(len(stageRecords)) + '-' + re.sub(r'[^\w.-]+', '_', name) + '.pstats')
+            profiler.dump_stats(str(profilePath))
+            record['profile'] = str(profilePath)
+
+        if stageRecords is not None:
+            stageRecords.append(record)
+
+
+# Settings passed to recordedCall in worker processes (None when stages are not recorded)
+def workerSettings():
+    return None if stageRecords is None else {'profileDir': profileDirectory}
+
+
+# Call a function (in a worker process), recording its stages when settings is not None
+# Returns the result of the function and the records of its stages
+def recordedCall(settings, function, *args):
+    if settings is None:
+        return function(*args), []
+
+    startInstrumentation(settings['profileDir'])
+
+    try:
+        return function(*args), stageRecords
+    finally:
+        stopInstrumentation()
+
+
+# Add the records of stages run in a worker process
+def addRecords(records):
+    if stageRecords is not None:
+        stageRecords.extend(records)
+
+
+# Write the recorded stages (and the total wall and CPU time of each kind of stage) as json
+def writeReport(reportPath, records):
+    totals = {}
+
+    for record in records:
+        kind = record['stage'].split(' ')[0]
+        total = totals.setdefault(kind, {'stages': 0, 'wall': 0.0, 'cpu': 0.0})
+        total['stages'] += 1
+        total['wall'] += record['wall']
+        total['cpu'] += record['cpu']
+
+    Path(reportPath).parent.mkdir(parents=True, exist_ok=True)
+
+    peakRSSes = [rss for rss in [peakRSS()] + [record['peakRSS'] for record in records] if rss is not None]
+
+    with open(reportPath, 'w') as reportFile:
+        json.dump({'peakRSS': max(peakRSSes, default=None), 'totals': totals, 'stages': records}, reportFile, indent=2)
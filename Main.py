@@ -1,9 +1,20 @@
+import argparse
+import os
 import zipfile
-import json
-import copy
 from pathlib import Path
+from ArchiveCache import loadMessageTable
+from ArchiveReader import inboxFolders
+from BatchAnalysis import conversationType
+from IncrementalAnalysis import updateAggregates
 from FeatureExtraction import *
-from BookmarkedConversations import *
+from FeatureSinks import *
+from Instrumentation import startInstrumentation, stopInstrumentation, writeReport
+
+try:
+    from BookmarkedConversations import *
+except ImportError:
+    # Conversations can still be given by their folder in the inbox of the archive
+    conversations = {'Individual': {}, 'Group': {}}
 
 
 '''
@@ -12,85 +23,165 @@ Date Modified: 2020-01-20
 Python Version: 3.7
 
 Data visualization/analysis of Facebook Messenger data from 2011-08-09 to 2020-01-20
+
+Run with --help for the command line options, e.g.
+python Main.py messages20200120.zip 'Jonathan Chow' -c Anonymous --all-conversations -f messagesPerDay breakLength
+python Main.py messages20200120.zip 'Jonathan Chow' -c Anonymous -f messagesPerDay --data csv --no-charts
+python Main.py messages20200120.zip 'Jonathan Chow' -c Anonymous --start 2019-01-01 --end 2019-12-31
 '''
 
 
-def analyzeSpecificConversation(archive, convName, me, convType, outputDir):
+ALL_FEATURES = ['messagesSentPerDay', 'cumWordUse', 'breakLength']
+
+
+# Compute the aggregates of features for conversation folders, either from the whole archive or merged into the stored
+# aggregates of previous exports when incrementalDir is given
+# Days are bucketed in timezone, or in the timezone of the sender for participants in participantTimezones
+# window holds the keyword arguments of MessageTable.dateWindow to only use the messages sent in a window of dates
+# Returns the aggregates and the first and last date of the messages they were computed from (None if not known), or
+# None for both when there are no messages
+def loadAggregates(archivePath, folders, me, featureNames, workers, cacheDir, incrementalDir, timezone, participantTimezones, window=None):
+    if incrementalDir is not None:
+        return updateAggregates(archivePath, folders, me, featureNames, incrementalDir, workers, timezone, participantTimezones), None
+
+    table = loadMessageTable(archivePath, folders, workers, cacheDir)
+    table.setTimezone(timezone, participantTimezones)
+
+    if window is not None:
+        table = table.dateWindow(**window)
+
+    if len(table) == 0:
+        return None, None
+
+    return aggregateFeatures(table, me, featureNames), table.dateRange()
+
+
+# Get the type of a conversation given by its name in BookmarkedConversations or by its inbox folder
+# The type of a conversation that is not bookmarked comes from its participants (None if I am not one of them)
+def findConversationType(archivePath, convName, me, workers=1, cacheDir='Cache/'):
+    for convType in conversations:
+        if convName in conversations[convType]:
+            return convType
+
+    return conversationType(loadMessageTable(archivePath, [convName], workers, cacheDir), me)
+
+
+def analyzeSpecificConversation(archivePath, convName, me, convType, outputDir, workers=1, cacheDir='Cache/', incrementalDir=None,
+                                timezone='UTC', participantTimezones=None, featureNames=SPECIFIC_FEATURES, dataFormats=(), charts=True,
+                                window=None):
     # Make sure that the conversation type is correct
     assert convType == 'Individual' or convType == 'Group'
 
-    # Make sure that the conversation name is in the dictionary
-    assert convName in conversations[convType]
+    # Conversations that are not in the dictionary are given by their folder
+    folder = conversations[convType].get(convName, convName)
 
     # Create output directory if it does not exist
     Path(outputDir).mkdir(parents=True, exist_ok=True)
 
-    # Open desired conversation as json
-    jsonConvList = []
-    convIndex = 1
-    while convIndex > 0:
-        try:
-            convID = 'messages/inbox/' + conversations[convType][convName] + '/message_' + str(convIndex) + '.json'
-            convRaw = archive.open(convID).read()
-            jsonConvList += [json.loads(convRaw)]
-            convIndex += 1
-        except KeyError:
-            break
-
-    # Create dictionary of all participants
-    participantList = list(set(parDict['name'] for conversation in jsonConvList for parDict in conversation['participants']))
-    participantDict = {participant: {} for participant in participantList}
-
-    messagesPerDay(jsonConvList, copy.deepcopy(participantDict), outputDir, me, convType)
-    wordsPerDay(jsonConvList, copy.deepcopy(participantDict), outputDir, me, convType)
-    cumMessageDiff(jsonConvList, copy.deepcopy(participantDict), outputDir, me)
-    cumWordDiff(jsonConvList, copy.deepcopy(participantDict), outputDir, me)
-    avgWordsPerMessage(jsonConvList, copy.deepcopy(participantDict), outputDir, me)
-    convInterest(jsonConvList, copy.deepcopy(participantDict), outputDir)
-    commonWords(jsonConvList, copy.deepcopy(participantDict), outputDir, me)
-
-
-def analyzeAllConversations(archive, me, outputDir):
+    # Load the desired conversation into aggregates shared by every feature (the table is cached if it has been read before)
+    aggregates, dates = loadAggregates(archivePath, [folder], me, featureNames, workers, cacheDir, incrementalDir, timezone, participantTimezones,
+                                       window)
+
+    if aggregates is None:
+        print(str(datetime.datetime.now()) + ': Skipped ' + convName + ' (no messages)')
+        return
+
+    sinkFeatures(aggregates, outputDir, me, convType, dataFormats, charts, dates)
+
+
+def analyzeAllConversations(archivePath, me, outputDir, workers=1, cacheDir='Cache/', incrementalDir=None, timezone='UTC',
+                            participantTimezones=None, featureNames=ALL_FEATURES, dataFormats=(), charts=True, window=None):
     # Create output directory if it does not exist
     Path(outputDir).mkdir(parents=True, exist_ok=True)
 
-    # Open all (individual and group) conversations from dictionary as json
-    jsonConvList = []
+    # Load all (individual and group) conversations from dictionary (or the whole inbox without one) into aggregates
+    # shared by every feature
+    folders = [conversations[convType][convName] for convType in conversations for convName in conversations[convType]]
 
-    for convType in conversations:
-        for convName in conversations[convType]:
-            convIndex = 1
-            while convIndex > 0:
-                try:
-                    convID = 'messages/inbox/' + conversations[convType][convName] + '/message_' + str(convIndex) + '.json'
-                    convRaw = archive.open(convID).read()
-                    jsonConvList += [json.loads(convRaw)]
-                    convIndex += 1
-                except KeyError:
-                    break
-
-    # Create dictionary of all participants
-    participantList = list(set(parDict['name'] for conversation in jsonConvList for parDict in conversation['participants']))
-    participantDict = {participant: {} for participant in participantList}
-
-    messagesSentPerDay(jsonConvList, copy.deepcopy(participantDict), outputDir, me)
-    cumWordUse(jsonConvList, outputDir, me)
-    breakLength(jsonConvList, outputDir, me)
+    if len(folders) == 0:
+        with zipfile.ZipFile(archivePath, 'r') as archive:
+            folders = inboxFolders(archive)
+
+    aggregates, dates = loadAggregates(archivePath, folders, me, featureNames, workers, cacheDir, incrementalDir, timezone, participantTimezones,
+                                       window)
+
+    if aggregates is None:
+        print(str(datetime.datetime.now()) + ': Skipped all conversations (no messages)')
+        return
+
+    sinkFeatures(aggregates, outputDir, me, None, dataFormats, charts, dates)
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Graph features of Facebook Messenger conversations')
+    parser.add_argument('archive', help='.zip file of messages')
+    parser.add_argument('self', help='your name as it appears in the archive')
+    parser.add_argument('-c', '--conversation', action='append', default=[],
+                        help='conversation to analyze, by its name in BookmarkedConversations or its inbox folder (repeatable)')
+    parser.add_argument('-a', '--all-conversations', action='store_true',
+                        help='analyze messages across all bookmarked conversations (or the whole inbox without bookmarks)')
+    parser.add_argument('-f', '--features', nargs='+', choices=SPECIFIC_FEATURES + ALL_FEATURES, default=SPECIFIC_FEATURES + ALL_FEATURES,
+                        metavar='FEATURE', help='features to compute (default: all), one of: ' + ', '.join(SPECIFIC_FEATURES + ALL_FEATURES))
+    parser.add_argument('-d', '--data', nargs='+', choices=DATA_FORMATS, default=[], metavar='FORMAT',
+                        help='write the data of each feature in these formats, any of: ' + ', '.join(DATA_FORMATS))
+    parser.add_argument('--no-charts', action='store_true', help='do not draw graphs (e.g. with --data)')
+    parser.add_argument('--report', help='write the wall/CPU time, peak RSS and messages/s of each stage to this json file')
+    parser.add_argument('--profile-dir', help='write cProfile stats of each stage to this directory (and the report, without --report)')
+    parser.add_argument('-o', '--output-dir', default='Output/', help='output directory (default: Output/)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of processes (default: all cpus)')
+    parser.add_argument('--cache-dir', default='Cache/', help='cache of parsed archives (default: Cache/, see ArchiveCache.py)')
+    parser.add_argument('--incremental-dir', help='merge this export into the aggregates stored from previous ones')
+    parser.add_argument('--timezone', default='UTC', help='timezone messages are bucketed into days in (default: UTC)')
+    parser.add_argument('--participant-timezone', action='append', default=[], metavar='NAME=TIMEZONE',
+                        help='bucket the messages of a participant in their own timezone (repeatable)')
+    parser.add_argument('--no-decimation', action='store_true', help='draw every point of long timeseries')
+    parser.add_argument('--start', help='only analyze messages sent on or after this date (YYYY-MM-DD, in --timezone)')
+    parser.add_argument('--end', help='only analyze messages sent on or before this date (YYYY-MM-DD, in --timezone)')
+    parser.add_argument('--last-days', type=int, help='only analyze messages sent in the last days of the archive (replaces --start)')
+    args = parser.parse_args()
+
+    if len(args.conversation) == 0 and not args.all_conversations:
+        parser.error('give at least one --conversation or --all-conversations')
+
+    window = {'start': args.start, 'end': args.end, 'lastDays': args.last_days}
+    window = window if any(value is not None for value in window.values()) else None
+
+    if window is not None and args.incremental_dir is not None:
+        parser.error('--start, --end and --last-days can not be used with --incremental-dir')
+
+    participantTimezones = dict(participantTimezone.split('=', 1) for participantTimezone in args.participant_timezone)
+    specificFeatures = [featureName for featureName in args.features if featureName in SPECIFIC_FEATURES]
+    allFeatures = [featureName for featureName in args.features if featureName in ALL_FEATURES]
+
     print(str(datetime.datetime.now()) + ': Started')
 
-    # The key for the conversation dictionary storing the codes for my specific conversations
-    conversationName = 'Anonymous'
-    self = 'Jonathan Chow'
-    conversationType = 'Individual'
-    outputDirectory = 'Output/' + conversationName + '/'
+    if args.report is not None or args.profile_dir is not None:
+        startInstrumentation(args.profile_dir)
+
+    if args.no_decimation:
+        setDecimation(None)
+
+    # Queue the graphs of every analysis and draw them together in a process pool
+    queueCharts()
+
+    if len(specificFeatures) > 0:
+        for conversationName in args.conversation:
+            convType = findConversationType(args.archive, conversationName, args.self, args.workers, args.cache_dir)
+
+            if convType is None:
+                parser.error(args.self + ' is not a participant of ' + conversationName)
+
+            analyzeSpecificConversation(args.archive, conversationName, args.self, convType,
+                                        args.output_dir + conversationName + '/', args.workers, args.cache_dir, args.incremental_dir,
+                                        args.timezone, participantTimezones, specificFeatures, args.data, not args.no_charts, window)
+
+    if args.all_conversations and len(allFeatures) > 0:
+        analyzeAllConversations(args.archive, args.self, args.output_dir + args.self.replace(' ', '') + '/', args.workers, args.cache_dir,
+                                args.incremental_dir, args.timezone, participantTimezones, allFeatures, args.data, not args.no_charts, window)
 
-    # Read .zip file of messages
-    messageArchive = zipfile.ZipFile('messages20200120.zip', 'r')
+    renderCharts(args.workers)
 
-    analyzeSpecificConversation(messageArchive, conversationName, self, conversationType, outputDirectory)
-    analyzeAllConversations(messageArchive, self, 'Output/' + self.replace(' ', '') + '/')
+    if args.report is not None or args.profile_dir is not None:
+        writeReport(args.report or str(Path(args.profile_dir) / 'report.json'), stopInstrumentation())
 
     print(str(datetime.datetime.now()) + ': Finished')
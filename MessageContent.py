@@ -0,0 +1,119 @@
+import numpy as np
+
+
+'''
+Author: Jonathan Chow
+Date Modified: 2026-10-18
+Python Version: 3.7
+
+Content of the messages of a MessageTable as one contiguous utf-8 buffer plus offsets
+
+Message i is buffer[offsets[i]:offsets[i + 1]]: its utf-8 encoded content followed by MESSAGE_SEPARATOR, or nothing for
+messages without content. Nothing is kept per message other than its offset, so the buffer takes roughly the size of
+the text itself (rather than a Python string object per message) and can be memory-mapped from the cache as it is.
+Decoding the whole buffer gives the content of every message joined by MESSAGE_SEPARATOR, which is what tokenizing
+needs. Spaces and separators are single bytes in utf-8 so they are counted on the buffer without decoding it.
+'''
+
+
+# Ends the content of each message in the buffer, must be whitespace so that it is kept by PUNCTUATION (see MessageTable.py)
+MESSAGE_SEPARATOR = '\x1e'
+
+SEPARATOR_BYTES = MESSAGE_SEPARATOR.encode()
+SPACE_BYTE = ord(' ')
+
+# Content is encoded with surrogatepass so that lone surrogates (\ud83d escapes split from their pair) survive
+ENCODING_ERRORS = 'surrogatepass'
+
+# Messages copied at a time by take (bounds the index array built for each copy)
+TAKE_CHUNK = 1 << 16
+
+
+def encodeContent(text):
+    return text.encode('utf-8', ENCODING_ERRORS) + SEPARATOR_BYTES
+
+
+class MessageContent:
+    def __init__(self, buffer, offsets):
+        self.buffer = buffer
+        self.offsets = offsets
+
+    # Content from a sequence of strings (None for messages without content)
+    @staticmethod
+    def fromStrings(texts):
+        encoded = [encodeContent(text) if text is not None else b'' for text in texts]
+        lengths = np.array([len(data) for data in encoded], dtype=np.int64)
+
+        return MessageContent(np.frombuffer(b''.join(encoded), dtype=np.uint8), np.concatenate([[0], np.cumsum(lengths)]))
+
+    # Content from the content of the messages with content joined and ended by MESSAGE_SEPARATOR (as returned by text()),
+    # where hasContent marks the messages with content
+    @staticmethod
+    def fromText(text, hasContent):
+        buffer = np.frombuffer(text.encode('utf-8', ENCODING_ERRORS), dtype=np.uint8)
+
+        # Messages without content end where the message before them ends
+        ends = np.zeros(len(hasContent), dtype=np.int64)
+        ends[hasContent] = np.flatnonzero(buffer == SEPARATOR_BYTES[0]) + 1
+
+        return MessageContent(buffer, np.concatenate([[0], np.maximum.accumulate(ends)]))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    # Content of one message (None if it has none)
+    def __getitem__(self, row):
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+
+        if start == end:
+            return None
+
+        return self.buffer[start:end - 1].tobytes().decode('utf-8', ENCODING_ERRORS)
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def hasContent(self):
+        return self.lengths() > 0
+
+    # Number of words (spaces + 1) of each message, 0 for messages without content
+    def wordCounts(self):
+        spaces = np.flatnonzero(self.buffer == SPACE_BYTE)
+        return (np.diff(np.searchsorted(spaces, self.offsets)) + self.hasContent()).astype(np.int32)
+
+    # Content of every message with content joined by MESSAGE_SEPARATOR (and ended by one)
+    def text(self):
+        return self.buffer.tobytes().decode('utf-8', ENCODING_ERRORS)
+
+    # Whether MESSAGE_SEPARATOR only appears at the end of each message, so text() can be split on it
+    def separable(self):
+        return np.count_nonzero(self.buffer == SEPARATOR_BYTES[0]) == np.count_nonzero(self.hasContent())
+
+    # Content of each message with content as a list of strings
+    def strings(self):
+        if self.separable():
+            return self.text().split(MESSAGE_SEPARATOR)[:-1]
+
+        return [self[row] for row in np.flatnonzero(self.hasContent())]
+
+    # Content of the messages of rows start to end, sharing the buffer of this content
+    def slice(self, start, end):
+        return MessageContent(self.buffer[self.offsets[start]:self.offsets[end]], self.offsets[start:end + 1] - self.offsets[start])
+
+    # Content of some messages (an array of rows or a boolean mask), in the order given
+    def take(self, rows):
+        rows = np.flatnonzero(rows) if rows.dtype == bool else np.asarray(rows)
+        starts = np.asarray(self.offsets[:-1])[rows]
+        lengths = np.asarray(self.offsets[1:])[rows] - starts
+
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        buffer = np.empty(offsets[-1], dtype=np.uint8)
+
+        # Gather the bytes of a chunk of messages at a time
+        for chunkStart in range(0, len(rows), TAKE_CHUNK):
+            chunk = slice(chunkStart, chunkStart + TAKE_CHUNK)
+            chunkOffsets = offsets[chunkStart:chunkStart + TAKE_CHUNK + 1]
+            index = np.repeat(starts[chunk] - chunkOffsets[:-1], lengths[chunk]) + np.arange(chunkOffsets[0], chunkOffsets[-1])
+            buffer[chunkOffsets[0]:chunkOffsets[-1]] = self.buffer[index]
+
+        return MessageContent(buffer, offsets)
@@ -0,0 +1,322 @@
+import array
+import datetime
+import re
+import numpy as np
+import pandas as pd
+from DailyCounts import DailyCounts
+from Instrumentation import stage
+from MessageContent import MESSAGE_SEPARATOR, MessageContent, encodeContent
+from Vocabulary import Vocabulary
+
+
+'''
+Author: Jonathan Chow
+Date Modified: 2026-10-18
+Python Version: 3.7
+
+Columnar representation of conversation data
+
+The messages of each conversation are walked once and flattened into parallel arrays (one entry per message) which are
+shared by every feature in FeatureExtraction. Participants are stored as integer codes into a list of names and the
+content of every message is kept in one utf-8 buffer (see MessageContent.py).
+'''
+
+
+# Characters removed from words (anything other than letters, digits, underscores and whitespace)
+PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+# Convert milliseconds (from start of unix time) to date in the local timezone of this computer
+def ms2dt(milliseconds):
+    s = milliseconds / 1000.0
+    return datetime.datetime.fromtimestamp(s)
+
+
+class MessageTable:
+    def __init__(self, participants, conversationParticipants, conversation, sender, timestampMs, content, conversationThreads=None):
+        # Sort messages chronologically (stable so messages with equal timestamps keep their order in the archive)
+        # Columns that are already sorted (e.g. memory-mapped from the cache) are used as they are
+        if np.any(timestampMs[1:] < timestampMs[:-1]):
+            order = np.argsort(timestampMs, kind='mergesort')
+            conversation, sender, timestampMs, content = conversation[order], sender[order], timestampMs[order], content.take(order)
+
+        self.participants = participants
+        self.conversationParticipants = conversationParticipants
+        self.conversationThreads = conversationThreads if conversationThreads is not None else [None] * len(conversationParticipants)
+        self.conversation = conversation
+        self.sender = sender
+        self.timestampMs = timestampMs
+        self.content = content
+
+        self.hasContent = content.hasContent()
+        self.wordCount = content.wordCounts()
+
+        self.tokenStream = None
+        self.wordVocabulary = None
+        self.counts = None
+
+        self.setTimezone('UTC')
+
+    def __len__(self):
+        return len(self.timestampMs)
+
+    # Convert timestamps to times in a timezone (a name understood by pandas, e.g. 'UTC' or 'America/Toronto')
+    # Messages are bucketed into days once here for every per day feature; participantTimezones optionally maps
+    # participants to the timezone their messages are bucketed in instead
+    def setTimezone(self, timezone, participantTimezones=None):
+        utcTimes = pd.to_datetime(np.array(self.timestampMs), unit='ms', utc=True)
+
+        self.timezone = timezone
+        self.participantTimezones = dict(participantTimezones or {})
+        self.datetimes = utcTimes.tz_convert(timezone).tz_localize(None)
+
+        dayTimes = self.datetimes.values.copy()
+
+        for participant, participantTimezone in self.participantTimezones.items():
+            if participant in self.participants:
+                mask = self.sender == self.code(participant)
+                dayTimes[mask] = utcTimes[mask].tz_convert(participantTimezone).tz_localize(None).values
+
+        self.dayNumbers = dayTimes.astype('datetime64[D]').astype(np.int64)
+        self.days = pd.DatetimeIndex(self.dayNumbers.astype('datetime64[D]'))
+
+        # Words are counted per day so the vocabulary depends on the timezone
+        self.wordVocabulary = None
+        self.counts = None
+
+    # Per day counters of the table shared by the per day features, see DailyCounts.py
+    def dailyCounts(self):
+        if self.counts is None:
+            with stage('daily counts', len(self)):
+                self.counts = DailyCounts(self)
+
+        return self.counts
+
+    # Table of the messages of some conversations (indices into conversationParticipants), keeping only their participants
+    def selectConversations(self, convIndices):
+        rows = np.isin(self.conversation, convIndices)
+        codes = np.unique(np.concatenate([self.sender[rows]] + [self.conversationParticipants[convIndex] for convIndex in convIndices]))
+
+        participantCodes = np.full(len(self.participants), -1, dtype=np.int32)
+        participantCodes[codes] = np.arange(len(codes))
+        convCodes = np.full(len(self.conversationParticipants), -1, dtype=np.int32)
+        convCodes[convIndices] = np.arange(len(convIndices))
+
+        table = MessageTable([self.participants[code] for code in codes],
+                             [participantCodes[self.conversationParticipants[convIndex]] for convIndex in convIndices],
+                             convCodes[self.conversation[rows]],
+                             participantCodes[self.sender[rows]],
+                             np.array(self.timestampMs[rows]),
+                             self.content.take(rows),
+                             [self.conversationThreads[convIndex] for convIndex in convIndices])
+        table.setTimezone(self.timezone, self.participantTimezones)
+
+        return table
+
+    # Rows of the messages sent from startMs up to (not including) endMs, found by binary search of the sorted timestamps
+    # None leaves that end of the range open
+    def rowRange(self, startMs=None, endMs=None):
+        start = 0 if startMs is None else int(np.searchsorted(self.timestampMs, startMs, side='left'))
+        end = len(self) if endMs is None else int(np.searchsorted(self.timestampMs, endMs, side='left'))
+
+        return start, max(start, end)
+
+    # Table of the messages sent from startMs up to endMs, keeping every participant and conversation
+    # Its columns are slices of the columns of this table, so only the messages in the window are read
+    def window(self, startMs=None, endMs=None):
+        start, end = self.rowRange(startMs, endMs)
+
+        table = MessageTable(self.participants,
+                             self.conversationParticipants,
+                             self.conversation[start:end],
+                             self.sender[start:end],
+                             self.timestampMs[start:end],
+                             self.content.slice(start, end),
+                             self.conversationThreads)
+        table.setTimezone(self.timezone, self.participantTimezones)
+
+        return table
+
+    # Times of timestamps (ms) in the timezone of the table, keeping the timezone so that times in the hour repeated when DST
+    # ends stay distinct (datetimes are the same times without it)
+    def zonedTimes(self, timestampMs):
+        return pd.to_datetime(np.asarray(timestampMs), unit='ms', utc=True).tz_convert(self.timezone)
+
+    # Start and end (ms, None if open) from the start of day start to the end of day end (dates in the timezone of the
+    # table), or of the last lastDays days of the table (ending on the day of its last message)
+    def windowMs(self, start=None, end=None, lastDays=None):
+        if lastDays is not None and len(self) > 0:
+            start = self.datetimes[-1].normalize() - pd.Timedelta(days=lastDays - 1)
+
+        startMs = None if start is None else self.dayStartMs(pd.Timestamp(start))
+        endMs = None if end is None else self.dayStartMs(pd.Timestamp(end) + pd.Timedelta(days=1))
+
+        return startMs, endMs
+
+    # First instant (ms) of the day of a timestamp in the timezone of the table
+    # Where the day starts at a DST change, midnight is shifted to the first time that exists and the earlier of two
+    # midnights is taken
+    def dayStartMs(self, timestamp):
+        return timestamp.normalize().tz_localize(self.timezone, ambiguous=True, nonexistent='shift_forward').value // 10 ** 6
+
+    # Table of the messages sent in a window of dates (see windowMs)
+    def dateWindow(self, start=None, end=None, lastDays=None):
+        return self.window(*self.windowMs(start, end, lastDays))
+
+    # Dates (in the timezone of the table) of the first and last message, None for an empty table
+    def dateRange(self):
+        if len(self) == 0:
+            return None
+
+        return self.datetimes[0].date(), self.datetimes[-1].date()
+
+    # Sender of each message as a categorical of participant names
+    def senders(self):
+        return pd.Categorical.from_codes(self.sender, categories=self.participants)
+
+    def code(self, participant):
+        return self.participants.index(participant)
+
+    # Code of the thread (conversation folder) of each conversation, shards of the same folder share a code
+    # Conversations without a thread are their own thread
+    def threadCodes(self):
+        threads = [thread if thread is not None else (convIndex,) for convIndex, thread in enumerate(self.conversationThreads)]
+        return pd.factorize(pd.Series(threads, dtype=object))[0].astype(np.int32)
+
+    # Thread (conversation folder) of each thread code, None for the threads of conversations without a thread
+    def threadNames(self):
+        codes = self.threadCodes()
+        names = np.full(codes.max() + 1 if len(codes) > 0 else 0, None, dtype=object)
+        names[codes] = self.conversationThreads
+
+        return names
+
+    # Rows in the order the messages are listed in the archive: threads in the order they were read, the messages of each
+    # newest first (messages sent at the same time keep their order)
+    def archiveOrder(self):
+        return np.lexsort((np.arange(len(self)), -self.timestampMs, self.threadCodes()[self.conversation]))
+
+    # Words of every message (split on spaces, lowercase and stripped of punctuation) with the row of their message
+    # The words of row i are tokens[tokenOffsets[i]:tokenOffsets[i + 1]]; computed once and shared by every feature
+    def tokens(self):
+        if self.tokenStream is None:
+            self.tokenStream = tokenize(self.content, np.flatnonzero(self.hasContent), self.wordCount[self.hasContent])
+            self.tokenOffsets = np.concatenate([[0], np.cumsum(self.wordCount, dtype=np.int64)])
+
+        return self.tokenStream
+
+    # Index of the words in the table with their counts per (day, sender, word), see Vocabulary.py
+    def vocabulary(self):
+        if self.wordVocabulary is None:
+            with stage('vocabulary', len(self)):
+                tokens, tokenRows = self.tokens()
+                self.wordVocabulary = Vocabulary(tokens, tokenRows, self.sender, self.dayNumbers, len(self.participants))
+
+        return self.wordVocabulary
+
+
+# Split messages into words, equivalent to [re.sub(r'[^\w\s]', '', word.lower()) for word in text.split(' ')] for each
+# Neither lowercasing nor removing punctuation moves spaces, so the decoded buffer of all messages (each ended by
+# MESSAGE_SEPARATOR) is normalized at once and split in one go
+def tokenize(content, rows, wordCount):
+    if len(rows) == 0:
+        words = []
+    elif content.separable():
+        words = PUNCTUATION.sub('', content.text()[:-1].lower()).replace(MESSAGE_SEPARATOR, ' ').split(' ')
+    else:
+        words = [PUNCTUATION.sub('', word.lower()) for text in content.strings() for word in text.split(' ')]
+
+    return np.array(words, dtype=object), np.repeat(rows, wordCount)
+
+
+# Words of a piece of text (e.g. a search query) normalized as tokenize does, leaving out the words that were only punctuation
+def normalizeWords(text):
+    return [word for word in (PUNCTUATION.sub('', word.lower()) for word in text.split(' ')) if word != '']
+
+
+class MessageTableBuilder:
+    def __init__(self):
+        self.participantCodes = {}
+        self.conversationParticipants = []
+        self.conversationThreads = []
+
+        self.conversation = array.array('i')
+        self.sender = array.array('i')
+        self.timestampMs = array.array('q')
+        self.contentBuffer = bytearray()
+        self.contentOffsets = array.array('q', [0])
+
+    def participantCode(self, name):
+        try:
+            return self.participantCodes[name]
+        except KeyError:
+            self.participantCodes[name] = len(self.participantCodes)
+            return self.participantCodes[name]
+
+    # Append the messages of one shard of a thread (its conversation folder), keeping only the fields used by the features
+    # The participants are read from shardInfo once the messages have been consumed (a streamed shard may list them last)
+    def addShard(self, shardInfo, messages, thread=None):
+        convIndex = len(self.conversationParticipants)
+
+        for message in messages:
+            self.conversation.append(convIndex)
+            self.sender.append(self.participantCode(message['sender_name']))
+            self.timestampMs.append(message['timestamp_ms'])
+
+            content = message.get('content')
+            if content is not None:
+                self.contentBuffer += encodeContent(content)
+            self.contentOffsets.append(len(self.contentBuffer))
+
+        self.conversationParticipants.append(np.array([self.participantCode(parDict['name']) for parDict in shardInfo['participants']], dtype=np.int32))
+        self.conversationThreads.append(thread)
+
+    # Content of the messages appended since message start
+    def contentSince(self, start):
+        contentStart = self.contentOffsets[start]
+
+        return MessageContent(np.frombuffer(bytes(self.contentBuffer[contentStart:]), dtype=np.uint8),
+                              np.array(self.contentOffsets[start:], dtype=np.int64) - contentStart)
+
+    # Replace the content of the messages appended since message start
+    def replaceContent(self, start, content):
+        contentStart = self.contentOffsets[start]
+
+        del self.contentBuffer[contentStart:]
+        self.contentBuffer += content.buffer.tobytes()
+
+        del self.contentOffsets[start:]
+        self.contentOffsets.frombytes((content.offsets + contentStart).astype(np.int64).tobytes())
+
+    # Append everything read by another builder (e.g. from a worker process), remapping its participant codes
+    def merge(self, other):
+        codes = np.array([self.participantCode(name) for name in other.participantCodes], dtype=np.int32)
+        convOffset = len(self.conversationParticipants)
+
+        self.conversation.frombytes((np.frombuffer(other.conversation, dtype=np.int32) + convOffset).astype(np.int32).tobytes())
+        self.sender.frombytes(codes[np.frombuffer(other.sender, dtype=np.int32)].tobytes())
+        self.timestampMs.extend(other.timestampMs)
+        self.contentOffsets.frombytes((np.frombuffer(other.contentOffsets, dtype=np.int64)[1:] + len(self.contentBuffer)).tobytes())
+        self.contentBuffer += other.contentBuffer
+
+        self.conversationParticipants.extend(codes[participantCodes] for participantCodes in other.conversationParticipants)
+        self.conversationThreads.extend(other.conversationThreads)
+
+    def build(self):
+        return MessageTable(list(self.participantCodes),
+                            self.conversationParticipants,
+                            np.frombuffer(self.conversation, dtype=np.int32),
+                            np.frombuffer(self.sender, dtype=np.int32),
+                            np.frombuffer(self.timestampMs, dtype=np.int64),
+                            MessageContent(np.frombuffer(self.contentBuffer, dtype=np.uint8), np.frombuffer(self.contentOffsets, dtype=np.int64)),
+                            self.conversationThreads)
+
+
+# Flatten a list of already parsed conversation json objects into a single table
+def buildMessageTable(conversationList):
+    builder = MessageTableBuilder()
+
+    for jsonConv in conversationList:
+        builder.addShard(jsonConv, jsonConv['messages'], jsonConv.get('thread_path'))
+
+    return builder.build()
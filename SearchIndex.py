@@ -0,0 +1,292 @@
+import argparse
+import shutil
+import time
+import zipfile
+import numpy as np
+import pandas as pd
+from ArchiveCache import loadMessageTable, tableEntryPath
+from ArchiveReader import inboxFolders
+from Instrumentation import stage
+from MessageContent import MessageContent
+from MessageTable import normalizeWords
+
+
+'''
+Author: Jonathan Chow
+Date Modified: 2026-10-18
+Python Version: 3.7
+
+Inverted index of the words of a MessageTable for term, phrase and prefix queries
+
+Words are normalized as in MessageTable.tokenize and every occurrence of a word is recorded by its position in the token
+stream of the table, from which its message (and so its conversation and timestamp) and its position in the message
+are found with the token offsets of the messages. The positions of each word are stored in ascending order as
+differences from the previous one, encoded as variable length integers (7 bits per byte), which takes 1 or 2 bytes for
+most occurrences. Words are sorted so a word or all words with a prefix are found by binary search, and their posting
+lists are contiguous so they are decoded at once with numpy. Phrases are occurrences of their words at consecutive
+positions of the same message.
+
+The index is built once per cached table and stored with it (see ArchiveCache.py). Run this file to search an archive:
+python SearchIndex.py messages20200120.zip 'how are you' --usage M
+'''
+
+
+INDEX_ARRAY_NAMES = ['termBuffer', 'termOffsets', 'postingCounts', 'postingOffsets', 'postings']
+
+
+# Encode non-negative integers as variable length integers, returning the bytes and the number of bytes of each integer
+def encodeVarints(values):
+    byteCounts = np.ones(len(values), dtype=np.int64)
+
+    for shift in range(7, 63, 7):
+        byteCounts += values >= (1 << shift)
+
+    valueOfByte = np.repeat(np.arange(len(values)), byteCounts)
+    byteIndex = np.arange(len(valueOfByte)) - (np.cumsum(byteCounts) - byteCounts)[valueOfByte]
+
+    # Every byte but the last of an integer has its high bit set
+    data = (values[valueOfByte] >> (7 * byteIndex)) & 0x7f
+    data[byteIndex < byteCounts[valueOfByte] - 1] |= 0x80
+
+    return data.astype(np.uint8), byteCounts
+
+
+def decodeVarints(data):
+    data = np.asarray(data)
+    continued = data >= 0x80
+
+    if not continued.any():
+        return data.astype(np.int64)
+
+    # The index of a byte in its integer is the number of continued bytes right before it
+    byteIndex = np.zeros(len(data), dtype=np.int64)
+    run = np.r_[False, continued[:-1]]
+    shift = 1
+
+    while run.any():
+        byteIndex += run
+        run = run & np.r_[np.zeros(shift + 1, dtype=bool), continued[:-shift - 1]]
+        shift += 1
+
+    # Each integer is the difference of the running sum of the bytes at its last byte and at the last byte of the one before
+    sums = np.cumsum((data & 0x7f).astype(np.int64) << (7 * byteIndex))[~continued]
+
+    return np.diff(sums, prepend=0)
+
+
+class SearchIndex:
+    def __init__(self, table, terms, postingCounts, postingOffsets, postings):
+        self.table = table
+        self.terms = terms
+        self.postingCounts = postingCounts
+        self.postingOffsets = postingOffsets
+        self.postings = postings
+
+        # Tokens of row i are at positions tokenOffsets[i] to tokenOffsets[i + 1] (see MessageTable.tokens)
+        self.tokenOffsets = np.concatenate([[0], np.cumsum(table.wordCount, dtype=np.int64)])
+
+    # Index the tokens of a table, leaving out the tokens that were only punctuation
+    @staticmethod
+    def build(table):
+        with stage('search index', len(table)):
+            tokens, _ = table.tokens()
+            termIds, terms = pd.factorize(tokens, sort=True)
+            terms = np.asarray(terms, dtype=object)
+
+            # The empty token sorts first
+            if len(terms) > 0 and terms[0] == '':
+                termIds, terms = termIds - 1, terms[1:]
+
+            # Positions of the tokens grouped by term, ascending within each term
+            positions = np.argsort(termIds, kind='stable')
+            positions = positions[np.count_nonzero(termIds < 0):]
+            postingCounts = np.bincount(termIds[termIds >= 0], minlength=len(terms)).astype(np.int64)
+
+            # The first position of each term is stored as it is and the others as the difference from the previous one
+            deltas = np.diff(positions, prepend=0)
+            firsts = (np.cumsum(postingCounts) - postingCounts)[postingCounts > 0]
+            deltas[firsts] = positions[firsts]
+
+            postings, byteCounts = encodeVarints(deltas)
+            termBytes = np.bincount(termIds[positions], weights=byteCounts, minlength=len(terms)).astype(np.int64)
+
+            return SearchIndex(table, terms, postingCounts, np.concatenate([[0], np.cumsum(termBytes)]), postings)
+
+    # Range of the ids of the terms equal to word (or starting with it if prefix is True)
+    def termRange(self, word, prefix=False):
+        start = int(np.searchsorted(self.terms, word, side='left'))
+
+        if prefix:
+            end = int(np.searchsorted(self.terms, word + '\U0010ffff', side='left'))
+        else:
+            end = start + 1 if start < len(self.terms) and self.terms[start] == word else start
+
+        return start, end
+
+    # Positions of every occurrence of the terms with ids start to end, in ascending order
+    def termPositions(self, start, end):
+        deltas = decodeVarints(self.postings[self.postingOffsets[start]:self.postingOffsets[end]])
+        counts = self.postingCounts[start:end]
+        firsts = np.cumsum(counts) - counts
+
+        # Sum the differences within the posting list of each term (the first of each is its first position)
+        positions = np.cumsum(deltas)
+        positions -= np.repeat(positions[firsts] - deltas[firsts], counts)
+
+        return np.sort(positions) if end - start > 1 else positions
+
+    # Positions of the occurrences of a word, or of any word starting with it if prefix is True
+    def word(self, word, prefix=False):
+        return self.termPositions(*self.termRange(word, prefix))
+
+    # Positions of the first word of each occurrence of words at consecutive positions of the same message
+    # The last word can be a prefix
+    def phrase(self, words, prefix=False):
+        termRanges = [self.termRange(word, prefix and offset == len(words) - 1) for offset, word in enumerate(words)]
+
+        # Start from the word with the fewest occurrences and keep the starts where every other word follows
+        offsets = sorted(range(len(words)), key=lambda offset: self.postingCounts[termRanges[offset][0]:termRanges[offset][1]].sum())
+        positions = self.termPositions(*termRanges[offsets[0]]) - offsets[0]
+
+        for offset in offsets[1:]:
+            following = self.termPositions(*termRanges[offset])
+            index = np.searchsorted(following, positions + offset)
+
+            mask = index < len(following)
+            mask[mask] = following[index[mask]] == positions[mask] + offset
+            positions = positions[mask]
+
+        # The words of a phrase are in the same message
+        if len(words) > 1:
+            positions = positions[self.rows(positions) == self.rows(positions + len(words) - 1)]
+
+        return positions
+
+    # Positions of the occurrences of a query (one or more words, normalized as the messages are), optionally only in the
+    # messages sent from startMs up to endMs
+    def search(self, query, prefix=False, startMs=None, endMs=None):
+        words = normalizeWords(query)
+        positions = self.phrase(words, prefix) if len(words) > 0 else np.zeros(0, dtype=np.int64)
+
+        if startMs is not None or endMs is not None:
+            start, end = self.table.rowRange(startMs, endMs)
+            positions = positions[np.searchsorted(positions, self.tokenOffsets[start]):np.searchsorted(positions, self.tokenOffsets[end])]
+
+        return positions
+
+    # Row (message) of each position
+    def rows(self, positions):
+        return np.searchsorted(self.tokenOffsets, positions, side='right') - 1
+
+    # Conversation, message (row of the table), timestamp and position in the message of each position
+    def matches(self, positions):
+        rows = self.rows(positions)
+
+        return pd.DataFrame({'conversation': self.table.conversation[rows],
+                             'message': rows,
+                             'timestampMs': self.table.timestampMs[rows],
+                             'position': positions - self.tokenOffsets[rows]})
+
+    # Number of occurrences sent by each participant per day (or per period, e.g. 'M' or 'Y'), in the timezone of the table
+    def usage(self, positions, period='D'):
+        rows = self.rows(positions)
+        senderCount = len(self.table.participants)
+        dayNumbers = self.table.dayNumbers[rows]
+        firstDay = int(dayNumbers.min()) if len(rows) > 0 else 0
+        dayCount = int(dayNumbers.max()) - firstDay + 1 if len(rows) > 0 else 0
+
+        # Count per (day, sender) in a dense array, keeping the days and senders with any occurrences
+        counts = np.bincount((dayNumbers - firstDay) * senderCount + self.table.sender[rows],
+                             minlength=dayCount * senderCount).reshape(dayCount, senderCount)
+        days, senders = np.flatnonzero(counts.any(axis=1)), np.flatnonzero(counts.any(axis=0))
+
+        usageDF = pd.DataFrame(counts[np.ix_(days, senders)], index=pd.DatetimeIndex((firstDay + days).astype('datetime64[D]')),
+                               columns=[self.table.participants[sender] for sender in senders])
+
+        if period != 'D':
+            usageDF = usageDF.groupby(usageDF.index.to_period(period).to_timestamp()).sum()
+
+        return usageDF
+
+
+def writeIndex(index, indexPath):
+    tempPath = indexPath.with_suffix('.tmp')
+    shutil.rmtree(tempPath, ignore_errors=True)
+    tempPath.mkdir(parents=True)
+
+    terms = MessageContent.fromStrings(index.terms)
+    arrays = {'termBuffer': terms.buffer,
+              'termOffsets': terms.offsets,
+              'postingCounts': index.postingCounts,
+              'postingOffsets': index.postingOffsets,
+              'postings': index.postings}
+
+    for name in INDEX_ARRAY_NAMES:
+        np.save(tempPath / (name + '.npy'), arrays[name])
+
+    shutil.rmtree(indexPath, ignore_errors=True)
+    tempPath.replace(indexPath)
+
+
+def readIndex(table, indexPath):
+    arrays = {name: np.load(indexPath / (name + '.npy'), mmap_mode='r') for name in INDEX_ARRAY_NAMES}
+    terms = np.array(MessageContent(arrays['termBuffer'], arrays['termOffsets']).strings(), dtype=object)
+
+    return SearchIndex(table, terms, arrays['postingCounts'], arrays['postingOffsets'], arrays['postings'])
+
+
+# Load the table for the given conversation folders and its search index from the cache, building the index on a miss
+def loadSearchIndex(archivePath, folders, workers=1, cacheDir='Cache/'):
+    table = loadMessageTable(archivePath, folders, workers, cacheDir)
+    indexPath = tableEntryPath(archivePath, folders, cacheDir) / 'index'
+
+    if (indexPath / 'postings.npy').exists():
+        with stage('index read'):
+            return readIndex(table, indexPath)
+
+    index = SearchIndex.build(table)
+
+    with stage('index write'):
+        writeIndex(index, indexPath)
+
+    return index
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Search the messages of an archive')
+    parser.add_argument('archive', help='.zip file of messages')
+    parser.add_argument('query', help='word or phrase to search for')
+    parser.add_argument('--prefix', action='store_true', help='match words starting with the (last) word of the query')
+    parser.add_argument('-c', '--conversation', action='append', default=[],
+                        help='only search this inbox folder (repeatable, default: the whole inbox)')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes reading the archive (default: 1)')
+    parser.add_argument('--cache-dir', default='Cache/', help='cache of parsed archives (default: Cache/, see ArchiveCache.py)')
+    parser.add_argument('--timezone', default='UTC', help='timezone of --start, --end and --usage (default: UTC)')
+    parser.add_argument('--start', help='only search messages sent on or after this date (YYYY-MM-DD)')
+    parser.add_argument('--end', help='only search messages sent on or before this date (YYYY-MM-DD)')
+    parser.add_argument('--usage', choices=['D', 'M', 'Y'], help='print the use of the query by each participant per day, month or year')
+    args = parser.parse_args()
+
+    folders = args.conversation
+
+    if len(folders) == 0:
+        with zipfile.ZipFile(args.archive, 'r') as archive:
+            folders = inboxFolders(archive)
+
+    index = loadSearchIndex(args.archive, folders, args.workers, args.cache_dir)
+    index.table.setTimezone(args.timezone)
+
+    searchStart = time.perf_counter()
+    positions = index.search(args.query, args.prefix, *index.table.windowMs(args.start, args.end))
+    searchTime = time.perf_counter() - searchStart
+
+    matchDF = index.matches(positions)
+    print(str(len(matchDF)) + ' matches in ' + str(matchDF['message'].nunique()) + ' messages ({:.1f} ms)'.format(searchTime * 1000))
+
+    # Matches per conversation folder
+    if len(matchDF) > 0:
+        threads = np.array([thread if thread is not None else '' for thread in index.table.conversationThreads], dtype=object)
+        print(pd.Series(threads[matchDF['conversation'].values]).value_counts().to_string())
+
+    if args.usage is not None and len(matchDF) > 0:
+        print(index.usage(positions, args.usage).to_string())
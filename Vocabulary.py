@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+
+'''
+Author: Jonathan Chow
+Date Modified: 2026-10-18
+Python Version: 3.7
+
+Index of the words used in a MessageTable
+
+Words are mapped to int32 ids (in alphabetical order) and counted per (day, sender, word) in a single pass over the
+token stream of the table. The counts are stored sparsely as parallel arrays sorted by day, sender and word, so any list
+of words can be looked up per day or per sender without going back to the messages.
+'''
+
+
+class Vocabulary:
+    def __init__(self, tokens, tokenRows, sender, dayNumbers, senderCount):
+        tokenIds, words = pd.factorize(tokens, sort=True)
+
+        self.words = np.asarray(words, dtype=object)
+        self.wordIndex = pd.Index(self.words)
+        self.senderCount = senderCount
+
+        # Word id of each token, to order the words of each sender by their first use (see senderWordCounts)
+        self.tokenIds = tokenIds.astype(np.int32)
+
+        # Count every (day, sender, word) combination at once by sorting a single combined key
+        self.keySize = max(len(self.words), 1)
+        keys = (dayNumbers[tokenRows].astype(np.int64) * senderCount + sender[tokenRows]) * self.keySize + tokenIds
+        keys, counts = np.unique(keys, return_counts=True)
+
+        self.word = (keys % self.keySize).astype(np.int32)
+        keys = keys // self.keySize
+        self.sender = (keys % senderCount).astype(np.int32)
+        self.day = keys // senderCount
+        self.count = counts
+
+    def __len__(self):
+        return len(self.words)
+
+    # Get the ids of words (-1 for words that are not in the vocabulary)
+    def wordIds(self, words):
+        return self.wordIndex.get_indexer(words)
+
+    # Number of times each sender used each word, as (sender, word, count) arrays sorted by sender and word
+    # Given the sender of each token and an order of the tokens, the words of each sender are sorted by their first use
+    # in that order instead
+    def senderWordCounts(self, tokenSenders=None, tokenOrder=None):
+        keys, inverse = np.unique(self.sender.astype(np.int64) * self.keySize + self.word, return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=self.count, minlength=len(keys)).astype(np.int64)
+
+        if tokenOrder is not None:
+            firstUses = pd.unique(tokenSenders[tokenOrder].astype(np.int64) * self.keySize + self.tokenIds[tokenOrder])
+            firstUses = firstUses[np.argsort(firstUses // self.keySize, kind='stable')]
+            keys, counts = firstUses, counts[np.searchsorted(keys, firstUses)]
+
+        return (keys // self.keySize).astype(np.int32), (keys % self.keySize).astype(np.int32), counts
+
+
+# Get the k largest values of a series in descending order (ties are kept in the order of the series)
+def topValues(featureSeries, k):
+    values = featureSeries.values
+
+    if len(values) > k:
+        threshold = values[np.argpartition(-values, k - 1)[k - 1]]
+        larger = np.flatnonzero(values > threshold)
+        tied = np.flatnonzero(values == threshold)[:k - len(larger)]
+        selected = np.concatenate([larger, tied])
+    else:
+        selected = np.arange(len(values))
+
+    selected = selected[np.lexsort((selected, -values[selected]))]
+
+    return featureSeries.iloc[selected]